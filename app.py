@@ -3,6 +3,8 @@ import streamlit as st
 import numpy as np
 import pandas as pd
 import os
+import io
+import hashlib
 import tempfile
 from PIL import Image
 import pretty_midi
@@ -18,40 +20,157 @@ if str(ROOT) not in sys.path:
 
 os.environ["BASIC_PITCH_BACKEND"] = "onnx"
 
-from utils.inference import predict_composer
+from utils.inference import predict_composer, load_composer_model
 from utils.audio_utils import convert_audio_to_midi
 from utils.vis_utils import plot_pianoroll_plotly_clean, plot_confidence_bars
-from utils.inference import _prep_roll, MODEL, COMPOSERS
+from utils.inference import _prep_roll, COMPOSERS
 from utils.score_utils import midi_to_musicxml_str, render_musicxml_osmd
 
 def get_base64_image(image_path):
     with open(image_path, "rb") as img_file:
         return base64.b64encode(img_file.read()).decode("utf-8")
 
-def is_valid_piano_midi(midi_path, min_notes=10, min_duration=2.0):
+def is_valid_piano_midi(midi, min_notes=10, min_duration=2.0):
+    """midi: a path, file object, already parsed PrettyMIDI or note_intervals() dict."""
     try:
-        pm = pretty_midi.PrettyMIDI(midi_path)
-        total_notes = sum(len(inst.notes) for inst in pm.instruments)
-        duration = pm.get_end_time()
+        if isinstance(midi, dict):
+            total_notes, duration = midi["n_notes"], midi["duration"]
+        else:
+            pm = midi if isinstance(midi, pretty_midi.PrettyMIDI) else pretty_midi.PrettyMIDI(midi)
+            total_notes = sum(len(inst.notes) for inst in pm.instruments)
+            duration = pm.get_end_time()
         return total_notes >= min_notes and duration >= min_duration
     except Exception:
         return False
 
+# ----- SINGLE-PASS PIANO-ROLL FEATURES ----- 
+# pm.get_piano_roll walks every note and pitch bend in Python, once per call. The notes are
+# collected once as intervals instead, and each roll is rasterized from them with numpy.
+# binary_roll(note_intervals(pm), fs) == (pm.get_piano_roll(fs=fs)[21:109] > 0), pedal + bends included.
+SUSTAIN_PEDAL_CC = 64
+
+def note_intervals(pm: pretty_midi.PrettyMIDI) -> dict:
+    """Sparse view of a MIDI file: per-instrument note intervals + the events that reshape the roll."""
+    instruments = []
+    for inst in pm.instruments:
+        if not inst.notes:
+            continue  # no notes -> empty roll, whatever else it holds
+        bends = sorted(inst.pitch_bends, key=lambda b: b.time)
+        instruments.append({
+            "start":    np.array([n.start for n in inst.notes]),
+            "end":      np.array([n.end for n in inst.notes]),
+            "pitch":    np.array([n.pitch for n in inst.notes]),
+            "velocity": np.array([n.velocity for n in inst.notes], dtype=float),
+            "end_time": inst.get_end_time(),
+            "is_drum":  inst.is_drum,
+            "pedal":    [(cc.time, cc.value) for cc in inst.control_changes if cc.number == SUSTAIN_PEDAL_CC],
+            "bend_times":   np.array([b.time for b in bends]),
+            "bend_pitches": np.array([b.pitch for b in bends]),
+        })
+    return {
+        "instruments": instruments,
+        "n_notes": sum(len(inst.notes) for inst in pm.instruments),
+        "duration": pm.get_end_time(),
+    }
+
+def _instrument_roll(inst: dict, fs: int, pedal_threshold: int = 64) -> np.ndarray:
+    """(128, T) velocity roll of one instrument, same values as Instrument.get_piano_roll(fs)."""
+    n_cols = int(fs * inst["end_time"])
+    if inst["is_drum"]:
+        return np.zeros((128, n_cols))
+
+    # notes: +velocity at the start column, -velocity at the end column, then a running sum
+    start = (inst["start"] * fs).astype(int)
+    end = (inst["end"] * fs).astype(int)
+    keep = end > start
+    diff = np.zeros((128, n_cols + 1))
+    np.add.at(diff, (inst["pitch"][keep], start[keep]), inst["velocity"][keep])
+    np.add.at(diff, (inst["pitch"][keep], end[keep]), -inst["velocity"][keep])
+    roll = np.cumsum(diff[:, :-1], axis=1)
+
+    # sustain pedal holds the loudest velocity so far until pedal-off
+    pedal_on, is_pedal_on = 0, False
+    for time, value in inst["pedal"]:
+        now = int(time * fs)
+        if not is_pedal_on and value >= pedal_threshold:
+            pedal_on, is_pedal_on = now, True
+        elif is_pedal_on and value < pedal_threshold:
+            roll[:, pedal_on:now] = np.maximum.accumulate(roll[:, pedal_on:now], axis=1)
+            is_pedal_on = False
+
+    # pitch bends shift their columns (until the next bend) and blend in the neighbouring pitch
+    if len(inst["bend_times"]):
+        cols = (np.append(inst["bend_times"], inst["end_time"]) * fs).astype(int)
+        owner = np.repeat(np.arange(len(inst["bend_pitches"])), np.diff(cols))  # bend covering each column
+        bent_cols = np.arange(cols[0], cols[-1])
+        pitch = inst["bend_pitches"][owner]
+        bent_cols, pitch = bent_cols[np.abs(pitch) >= 1], pitch[np.abs(pitch) >= 1]
+        if len(bent_cols):
+            semitones = pretty_midi.pitch_bend_to_semitones(pitch)
+            shift = (np.sign(semitones) * np.floor(np.abs(semitones))).astype(int)
+            decimal = np.abs(semitones - shift)
+
+            src = np.arange(128)[:, None] - shift[None, :]
+            valid = (src >= 0) & (src < 128)
+            shifted = np.where(valid, roll[np.clip(src, 0, 127), bent_cols[None, :]], 0.0)
+
+            up = pitch >= 0
+            bent = shifted.copy()
+            bent[1:, up] = (1 - decimal[up]) * shifted[1:, up] + decimal[up] * shifted[:-1, up]
+            bent[:-1, ~up] = (1 - decimal[~up]) * shifted[:-1, ~up] + decimal[~up] * shifted[1:, ~up]
+            roll[:, bent_cols] = bent
+    return roll
+
+def binary_roll(intervals: dict, fs: int) -> np.ndarray:
+    """(88, T) binary roll (A0..C8) at fs frames/second, all instruments."""
+    rolls = [_instrument_roll(inst, fs) for inst in intervals["instruments"]]
+    n_cols = max((r.shape[1] for r in rolls), default=0)
+    total = np.zeros((128, n_cols))
+    for r in rolls:
+        total[:, :r.shape[1]] += r
+    return (total[21:109, :] > 0).astype(np.uint8)
+
+def densest_windows(roll: np.ndarray, window: int = 512, k: int = 1) -> list:
+    """Start frames of the k densest non-overlapping windows (most active notes first), O(k*T).
+    Window sums come from a prefix sum over per-frame note counts; each pick blocks the windows
+    overlapping it. Ties go to the earliest window; rolls shorter than `window` give [0].
+    """
+    T = roll.shape[1]
+    if T <= window:
+        return [0]
+    csum = np.concatenate([[0], np.cumsum(roll.sum(axis=0), dtype=np.int64)])
+    sums = csum[window:] - csum[:-window]           # sums[s] = active cells in frames s..s+window-1
+    starts = []
+    for _ in range(k):
+        s = int(np.argmax(sums))
+        if sums[s] < 0:                             # every remaining window overlaps a pick
+            break
+        starts.append(s)
+        sums[max(0, s - window + 1):s + window] = -1
+    return starts
+
+def crop_roll(roll: np.ndarray, window: int = 512, start: int = 0) -> np.ndarray:
+    """(88, T) -> (88, window) from frame `start`, zero-padded at the end."""
+    seg = roll[:, start:start + window]
+    out = np.zeros((88, window), dtype=np.uint8)
+    out[:, :seg.shape[1]] = seg
+    return out
+
 def extract_best_512(pm: pretty_midi.PrettyMIDI, fs: int = 8, window: int = 512) -> np.ndarray:
     """
-    Training-exact roll: (88, 512), binary {0,1}, FS=8, left crop/pad.
+    Training-exact roll: (88, 512), binary {0,1}, FS=8, densest window (padded if shorter).
     Uses all instruments; rows 21..108 (A0..C8).
     """
-    roll = pm.get_piano_roll(fs=fs)[21:109, :]      # (88, T), velocities 0..127
-    roll = (roll > 0).astype(np.uint8)              # binary like training
+    roll = binary_roll(note_intervals(pm), fs)
+    return crop_roll(roll, window, densest_windows(roll, window)[0])
 
-    T = roll.shape[1]
-    out = np.zeros((88, window), dtype=np.uint8)
-    out[:, :min(T, window)] = roll[:, :window]      # left crop/pad
-    return out
+def extract_top_windows(pm: pretty_midi.PrettyMIDI, fs: int = 8, window: int = 512, k: int = 3) -> np.ndarray:
+    """(n, 88, window) rolls of the n <= k densest non-overlapping windows, densest first."""
+    roll = binary_roll(note_intervals(pm), fs)
+    return np.stack([crop_roll(roll, window, s) for s in densest_windows(roll, window, k)])
 
-def piano_likeness_flags(pm_obj, fs=8):
-    roll = (pm_obj.get_piano_roll(fs=fs)[21:109, :] > 0).astype(np.uint8)  # (88,T)
+def roll_likeness_flags(roll):
+    """roll: (88,T) binary."""
     if roll.size == 0 or roll.shape[1] == 0:
         return False, ["empty_roll"]
     notes_per_frame = roll.sum(axis=0)
@@ -69,6 +188,86 @@ def piano_likeness_flags(pm_obj, fs=8):
     ok = len(reasons) == 0
     return ok, reasons
 
+def piano_likeness_flags(pm_obj, fs=8):
+    return roll_likeness_flags(binary_roll(note_intervals(pm_obj), fs))
+
+def midi_features(pm: pretty_midi.PrettyMIDI, likeness_fs: int = 8, model_fs: int = 10, window: int = 512,
+                  n_windows: int = 1) -> dict:
+    """Everything the app checks, from one pass over the notes:
+    piano_like/reasons (fs=8 stats), roll (88,window) = densest window at fs=10 for the model,
+    window_starts/rolls = the n_windows densest non-overlapping windows, valid (notes/duration)."""
+    intervals = note_intervals(pm)
+    piano_like, reasons = roll_likeness_flags(binary_roll(intervals, likeness_fs))
+    model_roll = binary_roll(intervals, model_fs)
+    starts = densest_windows(model_roll, window, n_windows)
+    rolls = [crop_roll(model_roll, window, s) for s in starts]
+    return {
+        "piano_like": piano_like,
+        "reasons": reasons,
+        "roll": rolls[0],
+        "window_starts": starts,
+        "rolls": rolls,
+        "valid": is_valid_piano_midi(intervals),
+    }
+
+
+# ----- CACHED MODELS + PER-UPLOAD RESULTS -----
+# Streamlit reruns this script on every interaction (e.g. switching tabs), so models are
+# loaded once per process and results are memoized by the content hash of the upload.
+# (Basic Pitch sessions are shared through the model pool in utils.audio_utils.)
+RESULT_CACHE_ENTRIES = 32  # most recent uploads kept in memory
+
+@st.cache_resource(show_spinner=False)
+def get_composer_model():
+    return load_composer_model()
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def _write_temp(data: bytes, suffix: str) -> str:
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        tmp.write(data)
+        return tmp.name
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except Exception:
+        pass
+
+# the leading underscore keeps Streamlit from hashing the bytes again; the digest is the key
+@st.cache_data(max_entries=RESULT_CACHE_ENTRIES, show_spinner=False)
+def transcribe_audio(digest: str, _wav_bytes: bytes) -> bytes:
+    """WAV bytes -> MIDI bytes, all in memory."""
+    midi_buf = io.BytesIO()
+    convert_audio_to_midi(_wav_bytes, midi_out=midi_buf)
+    return midi_buf.getvalue()
+
+@st.cache_data(max_entries=RESULT_CACHE_ENTRIES, show_spinner=False)
+def analyze_midi(digest: str, _midi_bytes: bytes) -> dict:
+    """Piano checks, composer probabilities and the (88,512) roll for one MIDI file."""
+    pm = pretty_midi.PrettyMIDI(io.BytesIO(_midi_bytes))
+    feats = midi_features(pm, likeness_fs=8, model_fs=10, window=512)
+    result = {"piano_like": feats["piano_like"], "reasons": feats["reasons"], "valid": False,
+              "probs": None, "viz_roll": None}
+    if not feats["piano_like"]:
+        return result
+
+    # densest 512 frames, (88,512) in 0..127
+    pr = feats["roll"]
+    result["valid"] = feats["valid"]
+    if result["valid"]:
+        result["probs"], result["viz_roll"] = predict_composer(pr, model=get_composer_model())
+    return result
+
+@st.cache_data(max_entries=RESULT_CACHE_ENTRIES, show_spinner=False)
+def musicxml_for_midi(digest: str, _midi_bytes: bytes) -> str:
+    midi_path = _write_temp(_midi_bytes, ".mid")
+    try:
+        return midi_to_musicxml_str(midi_path)
+    finally:
+        _remove_quietly(midi_path)
+
 
 # ----- PAGE CONFIG + CUSTOM STYLES ----- 
 logo = Image.open("assets/images/logo.png")
@@ -326,8 +525,7 @@ with main_col:
 
     col_up, col_rec = st.columns(2, gap="large")
 
-    uploaded_midi = None
-    wav_path = None
+    midi_bytes = None
 
     with col_up:
         st.markdown("<h4>Upload MIDI</h4>", unsafe_allow_html=True)
@@ -339,72 +537,47 @@ with main_col:
 
     # ----- Priority: uploaded MIDI > recorded audio ----- 
     if uploaded_file is not None:
-        uploaded_midi = uploaded_file
+        midi_bytes = uploaded_file.getvalue()
     elif recorded_audio is not None:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_audio:
-            tmp_audio.write(recorded_audio.getbuffer())
-            wav_path = tmp_audio.name
+        wav_bytes = recorded_audio.getvalue()
         try:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".mid") as tmp_midi:
-                midi_out = tmp_midi.name
             with st.spinner("Transcribing audio → MIDI..."):
-                convert_audio_to_midi(wav_path, midi_out)
-            uploaded_midi = midi_out  # path string
+                midi_bytes = transcribe_audio(content_hash(wav_bytes), wav_bytes)
         except Exception as e:
             st.error(f"Transcription failed: {e}")
-            uploaded_midi = None
-        finally:
-            if wav_path:
-                try:
-                    os.remove(wav_path)
-                except Exception:
-                    pass
+            midi_bytes = None
 
     st.markdown('</div>', unsafe_allow_html=True) 
 
     # ----- INFERENCE ----- 
-    if uploaded_midi:
+    if midi_bytes:
+        midi_digest = content_hash(midi_bytes)
         with st.spinner("Analyzing composition..."):
-            if isinstance(uploaded_midi, str):
-                midi_path = uploaded_midi
-            else:
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".mid") as tmp_midi:
-                    tmp_midi.write(uploaded_midi.read())
-                    midi_path = tmp_midi.name
-    
             try:
-                pm = pretty_midi.PrettyMIDI(midi_path)
+                analysis = analyze_midi(midi_digest, midi_bytes)
 
                 # does this look like solo piano?
-                ok, reasons = piano_likeness_flags(pm, fs=8)
-                if not ok:
+                if not analysis["piano_like"]:
                     st.warning(
                         "This clip doesn’t look like solo piano (likely voice/whistle). "
-                        f"Reasons: {', '.join(reasons)}. Prediction may be unreliable."
+                        f"Reasons: {', '.join(analysis['reasons'])}. Prediction may be unreliable."
                     )
                     # *stop* here:
                     st.stop()
     
-                # densest 512 frames, (88,512) in 0..127
-                pr = extract_best_512(pm, fs=10, window=512)
-                #st.write({
-                    #"roll_shape": pr.shape,
-                    #"nonzero_frac": float(np.count_nonzero(pr) / pr.size),
-                  #  "max": int(pr.max()),
-                #})
                 # DEBUG: raw probs and predicted label (prettiest check)
-                #raw = MODEL.predict(_prep_roll(pr), verbose=0)[0]
+                #raw = get_composer_model().predict(_prep_roll(pr), verbose=0)[0]
                 #st.write({"probs": np.round(raw, 4).tolist(), "sum": float(raw.sum())})
                 #pred_idx = int(np.argmax(raw, axis=-1))
                # st.write({"predicted_label": COMPOSERS[pred_idx]})
     
-                if not is_valid_piano_midi(midi_path):
+                if not analysis["valid"]:
                     st.warning(
                         "The MIDI appears too short or sparse. "
                         "Please try a clearer solo piano clip."
                     )
                 else:
-                    pred_probs, viz_roll = predict_composer(pr)  # viz_roll: (88,512)
+                    pred_probs, viz_roll = analysis["probs"], analysis["viz_roll"]  # viz_roll: (88,512)
                     #st.write("Softmax:", list(pred_probs.items()))
     
                     pie_col, viz_col = st.columns([1, 1], gap="large")
@@ -425,18 +598,13 @@ with main_col:
                             with st.spinner("Rendering Sheet Music…"):
                                 try:
                                     # keep it light; adjust height as you like
-                                    xml = midi_to_musicxml_str(midi_path)
+                                    xml = musicxml_for_midi(midi_digest, midi_bytes)
                                     render_musicxml_osmd(xml, height=320, compact=True)
                                 except Exception as e:
                                     st.warning(f"Couldn’t render sheet music: {e}")
     
             except Exception as e:
                 st.error(f"Failed to analyze MIDI: {e}")
-            finally:
-                try:
-                    os.remove(midi_path)
-                except Exception:
-                    pass
 
 # ----- Footer: Contact form + links ----- 
 
@@ -16,28 +16,35 @@
 # limitations under the License.
 
 import enum
+import importlib.util
 import logging
+import os
 import pathlib
+from typing import Optional
 
+# name of the environment variable selecting the preferred backend, one of FilenameSuffix's names
+BACKEND_ENV_VAR = "BASIC_PITCH_BACKEND"
 
-try:
-    import coremltools
 
-    CT_PRESENT = True
-except ImportError:
-    CT_PRESENT = False
+def _is_installed(module_name: str) -> bool:
+    """Check whether a module can be imported, without importing it."""
+    try:
+        return importlib.util.find_spec(module_name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+# backends are only detected here, they are imported when a Model is loaded
+CT_PRESENT = _is_installed("coremltools")
+if not CT_PRESENT:
     logging.warning(
         "Coremltools is not installed. "
         "If you plan to use a CoreML Saved Model, "
         "reinstall basic-pitch with `pip install 'basic-pitch[coreml]'`"
     )
 
-try:
-    import tflite_runtime.interpreter
-
-    TFLITE_PRESENT = True
-except ImportError:
-    TFLITE_PRESENT = False
+TFLITE_PRESENT = _is_installed("tflite_runtime")
+if not TFLITE_PRESENT:
     logging.warning(
         "tflite-runtime is not installed. "
         "If you plan to use a TFLite Model, "
@@ -45,25 +52,16 @@ except ImportError:
         "`pip install 'basic-pitch[tf]'"
     )
 
-try:
-    import onnxruntime
-
-    ONNX_PRESENT = True
-except ImportError:
-    ONNX_PRESENT = False
+ONNX_PRESENT = _is_installed("onnxruntime")
+if not ONNX_PRESENT:
     logging.warning(
         "onnxruntime is not installed. "
         "If you plan to use an ONNX Model, "
         "reinstall basic-pitch with `pip install 'basic-pitch[onnx]'`"
     )
 
-
-try:
-    import tensorflow
-
-    TF_PRESENT = True
-except ImportError:
-    TF_PRESENT = False
+TF_PRESENT = _is_installed("tensorflow")
+if not TF_PRESENT:
     logging.warning(
         "Tensorflow is not installed. "
         "If you plan to use a TF Saved Model, "
@@ -78,7 +76,40 @@ class FilenameSuffix(enum.Enum):
     onnx = "nmp.onnx"
 
 
-if TF_PRESENT:
+def _is_backend_present(suffix: FilenameSuffix) -> bool:
+    if suffix == FilenameSuffix.tf:
+        return TF_PRESENT
+    elif suffix == FilenameSuffix.coreml:
+        return CT_PRESENT
+    elif suffix == FilenameSuffix.tflite:
+        return TFLITE_PRESENT or TF_PRESENT
+    return ONNX_PRESENT
+
+
+def get_preferred_backend() -> Optional[FilenameSuffix]:
+    """Get the backend requested with the BASIC_PITCH_BACKEND environment variable.
+
+    Returns:
+        The requested backend, or None if none is requested or it is not installed.
+    """
+    preferred = os.environ.get(BACKEND_ENV_VAR)
+    if not preferred:
+        return None
+    if preferred not in FilenameSuffix.__members__:
+        logging.warning(
+            "Ignoring %s=%s, expected one of %s.", BACKEND_ENV_VAR, preferred, list(FilenameSuffix.__members__)
+        )
+        return None
+    if not _is_backend_present(FilenameSuffix[preferred]):
+        logging.warning("Ignoring %s=%s, the backend is not installed.", BACKEND_ENV_VAR, preferred)
+        return None
+    return FilenameSuffix[preferred]
+
+
+_preferred_model_type = get_preferred_backend()
+if _preferred_model_type is not None:
+    _default_model_type = _preferred_model_type
+elif TF_PRESENT:
     _default_model_type = FilenameSuffix.tf
 elif CT_PRESENT:
     _default_model_type = FilenameSuffix.coreml
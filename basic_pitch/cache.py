@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright 2022 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import functools
+import hashlib
+import logging
+import os
+import pathlib
+import tempfile
+import threading
+from typing import BinaryIO, Dict, Optional, Union
+
+import numpy as np
+import numpy.typing as npt
+
+from basic_pitch.constants import AUDIO_SAMPLE_RATE, DEFAULT_RESAMPLE_QUALITY
+
+DEFAULT_MAX_SIZE_BYTES = 2 * 1024**3
+HASH_BLOCK_SIZE = 1024**2
+CACHE_FILE_SUFFIX = ".npz"
+
+
+def hash_file(path: Union[pathlib.Path, str]) -> str:
+    """Hash the content of a file, or of all files in a directory.
+
+    Args:
+        path: Path to a file or directory.
+
+    Returns:
+        The hex digest of the content.
+    """
+    path = pathlib.Path(path)
+    file_paths = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+    digest = hashlib.sha256()
+    for file_path in file_paths:
+        if path.is_dir():
+            digest.update(str(file_path.relative_to(path)).encode("utf-8"))
+        with open(file_path, "rb") as fhandle:
+            for block in iter(lambda: fhandle.read(HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_stream(fhandle: BinaryIO) -> str:
+    """Hash the remaining content of a binary file-like object, then seek back to where it was.
+
+    Args:
+        fhandle: A seekable binary file-like object.
+
+    Returns:
+        The hex digest of the content.
+    """
+    position = fhandle.tell()
+    digest = hashlib.sha256()
+    for block in iter(lambda: fhandle.read(HASH_BLOCK_SIZE), b""):
+        digest.update(block)
+    fhandle.seek(position)
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _hash_model(model_path: str) -> str:
+    return hash_file(model_path)
+
+
+class ModelOutputCache:
+    """On-disk cache of model outputs, keyed by the content of the audio and of the model.
+
+    Entries are compressed npz files holding the unwrapped note, onset and contour arrays.
+    When the cache grows beyond max_size_bytes, the least recently used entries are removed.
+    """
+
+    def __init__(self, cache_dir: Union[pathlib.Path, str], max_size_bytes: int = DEFAULT_MAX_SIZE_BYTES):
+        """
+        Args:
+            cache_dir: Directory to store cached model outputs in. Created if it does not exist.
+            max_size_bytes: Maximum total size of the cached files.
+        """
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size_bytes = max_size_bytes
+        self._lock = threading.Lock()
+
+    def key(
+        self,
+        audio: Union[pathlib.Path, str, BinaryIO, npt.NDArray[np.float32]],
+        model_path: Union[pathlib.Path, str],
+        resample_quality: str = DEFAULT_RESAMPLE_QUALITY,
+    ) -> str:
+        """Build the cache key of a model output.
+
+        Args:
+            audio: Path to an audio file, a seekable binary file-like object holding one, or an already
+                loaded signal. The position of a file-like object is restored after hashing.
+            model_path: Path to the serialized model producing the output.
+            resample_quality: soxr quality preset the audio file is resampled with.
+
+        Returns:
+            The cache key.
+        """
+        if isinstance(audio, np.ndarray):
+            audio_hash = hashlib.sha256(np.ascontiguousarray(audio).tobytes()).hexdigest()
+        elif hasattr(audio, "read"):
+            audio_hash = hash_stream(audio)
+        else:
+            audio_hash = hash_file(audio)
+        model_hash = _hash_model(str(pathlib.Path(model_path).resolve()))
+        key = f"{audio_hash}:{model_hash}:{AUDIO_SAMPLE_RATE}:{resample_quality}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> pathlib.Path:
+        return self.cache_dir / f"{key}{CACHE_FILE_SUFFIX}"
+
+    def get(self, key: str) -> Optional[Dict[str, npt.NDArray[np.float32]]]:
+        """Load a cached model output.
+
+        Args:
+            key: The cache key.
+
+        Returns:
+            The model output, or None if it is not cached. Unreadable entries are removed and count as a miss.
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                model_output = {k: data[k] for k in data.files}
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # a truncated or corrupt entry can fail anywhere in np.load (zipfile.BadZipFile, EOFError, zlib.error,
+            # a malformed npy header, ...); treat it as a miss and remove it so it is rewritten on the next put
+            logging.warning("Discarding unreadable cached model output %s: %s", path, e.__repr__())
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            return None
+        return model_output
+
+    def put(self, key: str, model_output: Dict[str, npt.NDArray[np.float32]]) -> None:
+        """Store a model output, evicting the least recently used entries if the cache is too large.
+
+        Args:
+            key: The cache key.
+            model_output: The unwrapped model output to store.
+        """
+        # write to a temporary file first so readers never see a partially written entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fhandle:
+                np.savez_compressed(fhandle, **model_output)
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache fits in max_size_bytes."""
+        with self._lock:
+            entries = []
+            for path in self.cache_dir.glob(f"*{CACHE_FILE_SUFFIX}"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+            total_size = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total_size <= self.max_size_bytes:
+                    break
+                try:
+                    path.unlink()
+                except OSError as e:
+                    logging.warning("Could not evict cached model output %s: %s", path, e.__repr__())
+                    continue
+                total_size -= size
@@ -27,6 +27,9 @@ CONTOURS_BINS_PER_SEMITONE = 3
 ANNOTATIONS_BASE_FREQUENCY = 27.5  # lowest key on a piano
 ANNOTATIONS_N_SEMITONES = 88  # number of piano keys
 AUDIO_SAMPLE_RATE = 22050
+# soxr quality presets used when resampling input audio to AUDIO_SAMPLE_RATE, from best to fastest
+RESAMPLE_QUALITIES = ("VHQ", "HQ", "MQ", "LQ", "QQ")
+DEFAULT_RESAMPLE_QUALITY = "HQ"  # librosa's default
 AUDIO_N_CHANNELS = 1
 N_FREQ_BINS_NOTES = ANNOTATIONS_N_SEMITONES * NOTES_BINS_PER_SEMITONE
 N_FREQ_BINS_CONTOURS = ANNOTATIONS_N_SEMITONES * CONTOURS_BINS_PER_SEMITONE
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright 2022 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import pathlib
+import traceback
+
+
+def main() -> None:
+    """Handle command line arguments. Entrypoint for this script."""
+    parser = argparse.ArgumentParser(
+        description="Create midi from saved model outputs (--save-model-outputs), without running the model."
+    )
+    parser.add_argument("output_dir", type=str, help="directory to save outputs")
+    parser.add_argument(
+        "model_output_paths",
+        type=str,
+        nargs="+",
+        help="Space separated paths to the saved model output npz files.",
+    )
+    parser.add_argument(
+        "--save-midi",
+        action="store_true",
+        default=True,
+        help="Create a MIDI file.",
+    )
+    parser.add_argument(
+        "--sonify-midi",
+        action="store_true",
+        help="Create an audio .wav file which sonifies the MIDI outputs.",
+    )
+    parser.add_argument(
+        "--save-note-events",
+        action="store_true",
+        help="Save the predicted note events as a csv file.",
+    )
+    parser.add_argument(
+        "--onset-threshold",
+        type=float,
+        default=0.5,
+        help="The minimum likelihood for an onset to occur, between 0 and 1.",
+    )
+    parser.add_argument(
+        "--frame-threshold",
+        type=float,
+        default=0.3,
+        help="The minimum likelihood for a frame to sustain, between 0 and 1.",
+    )
+    parser.add_argument(
+        "--minimum-note-length",
+        type=float,
+        default=127.70,
+        help="The minimum allowed note length, in miliseconds.",
+    )
+    parser.add_argument(
+        "--minimum-frequency",
+        type=float,
+        default=None,
+        help="The minimum allowed note frequency, in Hz.",
+    )
+    parser.add_argument(
+        "--maximum-frequency",
+        type=float,
+        default=None,
+        help="The maximum allowed note frequency, in Hz.",
+    )
+    parser.add_argument(
+        "--multiple-pitch-bends",
+        action="store_true",
+        help="Allow overlapping notes in midi file to have pitch bends. Note: this will map each "
+        "pitch to its own instrument",
+    )
+    parser.add_argument(
+        "--sonification-samplerate",
+        type=int,
+        default=44100,
+        help="The samplerate for sonified audio files.",
+    )
+    parser.add_argument(
+        "--midi-tempo",
+        type=float,
+        default=120,
+        help="The tempo for the midi file.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="The number of processes decoding files in parallel. If 0, files are decoded in the main process.",
+    )
+    parser.add_argument(
+        "--mmap",
+        action="store_true",
+        help="Memory-map float32 model outputs (saved uncompressed) instead of reading them.",
+    )
+    parser.add_argument(
+        "--no-melodia",
+        default=False,
+        action="store_true",
+        help="Skip the melodia trick.",
+    )
+    args = parser.parse_args()
+
+    print("")
+    print("✨✨✨✨✨✨✨✨✨")
+    print("✨ Basic Pitch  ✨")
+    print("✨✨✨✨✨✨✨✨✨")
+    print("")
+
+    from basic_pitch.inference import (
+        decode_and_save,
+        verify_output_dir,
+        verify_input_path,
+    )
+
+    output_dir = pathlib.Path(args.output_dir)
+    verify_output_dir(output_dir)
+
+    model_output_path_list = [pathlib.Path(model_output_path) for model_output_path in args.model_output_paths]
+    for model_output_path in model_output_path_list:
+        verify_input_path(model_output_path)
+
+    try:
+        decode_and_save(
+            model_output_path_list,
+            output_dir,
+            args.save_midi,
+            args.sonify_midi,
+            args.save_note_events,
+            args.onset_threshold,
+            args.frame_threshold,
+            args.minimum_note_length,
+            args.minimum_frequency,
+            args.maximum_frequency,
+            args.multiple_pitch_bends,
+            not args.no_melodia,
+            args.sonification_samplerate,
+            args.midi_tempo,
+            args.workers,
+            args.mmap,
+        )
+        print("\n✨ Done ✨\n")
+    except IOError as ioe:
+        print(ioe)
+    except Exception as e:
+        print("🚨 Something went wrong 😔 - see the traceback below for details.")
+        print("")
+        print(e)
+        print(traceback.format_exc())
+
+
+if __name__ == "__main__":
+    main()
@@ -15,48 +15,66 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+import concurrent.futures
 import csv
 import enum
+import functools
+import itertools
 import json
 import logging
 import os
 import pathlib
-from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union, cast
-
+import struct
+import zipfile
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+    cast,
+)
 
-from basic_pitch import CT_PRESENT, ICASSP_2022_MODEL_PATH, ONNX_PRESENT, TF_PRESENT, TFLITE_PRESENT
 
-try:
-    import tensorflow as tf
-except ImportError:
-    pass
+from basic_pitch import (
+    CT_PRESENT,
+    FilenameSuffix,
+    ICASSP_2022_MODEL_PATH,
+    ONNX_PRESENT,
+    TF_PRESENT,
+    TFLITE_PRESENT,
+    get_preferred_backend,
+)
 
-try:
+if TYPE_CHECKING:
+    # backends are imported lazily by Model, as importing them is slow
     import coremltools as ct
-except ImportError:
-    pass
-
-try:
-    import tflite_runtime.interpreter as tflite
-except ImportError:
-    if TF_PRESENT:
-        import tensorflow.lite as tflite
-
-try:
     import onnxruntime as ort
-except ImportError:
-    pass
+    import tensorflow as tf
 
 import numpy as np
 import numpy.typing as npt
+from numpy.lib.stride_tricks import sliding_window_view
 import librosa
 import pretty_midi
+import soundfile
+import soxr
 
 from basic_pitch.constants import (
     AUDIO_SAMPLE_RATE,
     AUDIO_N_SAMPLES,
     ANNOTATIONS_FPS,
+    DEFAULT_RESAMPLE_QUALITY,
     FFT_HOP,
+    RESAMPLE_QUALITIES,
 )
 from basic_pitch.commandline_printing import (
     generating_file_message,
@@ -64,8 +82,20 @@ from basic_pitch.commandline_printing import (
     file_saved_confirmation,
     failed_to_save,
 )
+from basic_pitch.cache import ModelOutputCache
+from basic_pitch.note_events import NoteEvents
 import basic_pitch.note_creation as infer
 
+# number of audio windows passed to the model per call
+DEFAULT_BATCH_SIZE = 16
+# number of samples decoded at a time when streaming audio files
+AUDIO_READ_BLOCK_SIZE = 2**16
+# storage precisions of saved model outputs. float32 arrays are written uncompressed (and can be
+# memory-mapped), float16 and uint8 (activations quantized to 1/255 steps) are written compressed
+MODEL_OUTPUT_PRECISIONS = ("float32", "float16", "uint8")
+# key of the pickled dictionary older versions saved float32 model outputs as
+MODEL_OUTPUT_NPZ_KEY = "basic_pitch_model_output"
+
 
 class Model:
     class MODEL_TYPES(enum.Enum):
@@ -74,70 +104,73 @@ class Model:
         TFLITE = enum.auto()
         ONNX = enum.auto()
 
-    def __init__(self, model_path: Union[pathlib.Path, str]):
-        present = []
-        if TF_PRESENT:
-            present.append("TensorFlow")
-            try:
-                self.model_type = Model.MODEL_TYPES.TENSORFLOW
-                self.model = tf.saved_model.load(str(model_path))
-                return
-            except Exception as e:
-                if os.path.isdir(model_path) and {"saved_model.pb", "variables"} & set(os.listdir(model_path)):
-                    logging.warning(
-                        "Could not load TensorFlow saved model %s even "
-                        "though it looks like a saved model file with error %s. "
-                        "Are you sure it's a TensorFlow saved model?",
-                        model_path,
-                        e.__repr__(),
-                    )
+    def __init__(
+        self,
+        model_path: Union[pathlib.Path, str],
+        model_type: Optional["Model.MODEL_TYPES"] = None,
+        num_threads: Optional[int] = None,
+        inter_op_num_threads: Optional[int] = None,
+        graph_optimization_level: Optional[str] = None,
+        enable_cpu_mem_arena: bool = True,
+        enable_mem_pattern: bool = True,
+    ):
+        """Load a serialized model.
+
+        Args:
+            model_path: Path to a serialized model.
+            model_type: The backend to load the model with. If None, all installed backends are tried,
+                starting with the one set in the BASIC_PITCH_BACKEND environment variable.
+            num_threads: Number of threads used within an operation (ONNX, TFLite and TensorFlow).
+                If None, the backend default is used.
+            inter_op_num_threads: Number of threads used to run independent operations in parallel
+                (ONNX and TensorFlow). If None, the backend default is used.
+            graph_optimization_level: ONNX graph optimization level, one of "disable", "basic",
+                "extended" or "all". If None, the onnxruntime default is used.
+            enable_cpu_mem_arena: Whether ONNX uses a memory arena for CPU allocations.
+            enable_mem_pattern: Whether ONNX preallocates memory based on previous runs.
+
+        Raises:
+            ValueError: If graph_optimization_level is not a known level, or if the model cannot be loaded.
+        """
+        if graph_optimization_level is not None and graph_optimization_level not in ONNX_GRAPH_OPTIMIZATION_LEVELS:
+            raise ValueError(
+                f"graph_optimization_level must be one of {list(ONNX_GRAPH_OPTIMIZATION_LEVELS)}, "
+                f"got {graph_optimization_level!r}"
+            )
 
-        if CT_PRESENT:
-            present.append("CoreML")
-            try:
-                self.model_type = Model.MODEL_TYPES.COREML
-                self.model = ct.models.MLModel(str(model_path))
-                return
-            except Exception as e:
-                if str(model_path).endswith(".mlpackage"):
-                    logging.warning(
-                        "Could not load CoreML file %s even "
-                        "though it looks like a CoreML file with error %s. "
-                        "Are you sure it's a CoreML file?",
-                        model_path,
-                        e.__repr__(),
-                    )
+        self.model_path = model_path
+        self.num_threads = num_threads
+        self.inter_op_num_threads = inter_op_num_threads
+        self.graph_optimization_level = graph_optimization_level
+        self.enable_cpu_mem_arena = enable_cpu_mem_arena
+        self.enable_mem_pattern = enable_mem_pattern
 
-        if TFLITE_PRESENT or TF_PRESENT:
-            present.append("TensorFlowLite")
+        if model_type is not None:
+            if not Model.is_backend_present(model_type):
+                raise ValueError(f"Cannot load {model_path} with {BACKEND_NAMES[model_type]}, it is not installed.")
             try:
-                self.model_type = Model.MODEL_TYPES.TFLITE
-                self.interpreter = tflite.Interpreter(str(model_path))
-                self.model = self.interpreter.get_signature_runner()
-                return
+                self._load(model_type, model_path)
             except Exception as e:
-                if str(model_path).endswith(".tflite"):
-                    logging.warning(
-                        "Could not load TensorFlowLite file %s even "
-                        "though it looks like a TFLite file with error %s. "
-                        "Are you sure it's a TFLite file?",
-                        model_path,
-                        e.__repr__(),
-                    )
+                raise ValueError(
+                    f"File {model_path} cannot be loaded with {BACKEND_NAMES[model_type]}, error {e.__repr__()}"
+                ) from e
+            return
 
-        if ONNX_PRESENT:
-            present.append("ONNX")
+        present = []
+        for model_type in Model.probe_order():
+            if not Model.is_backend_present(model_type):
+                continue
+            present.append(BACKEND_NAMES[model_type])
             try:
-                self.model_type = Model.MODEL_TYPES.ONNX
-                self.model = ort.InferenceSession(str(model_path), providers=["CPUExecutionProvider"])
+                self._load(model_type, model_path)
                 return
             except Exception as e:
-                if str(model_path).endswith(".onnx"):
+                if _looks_like_model_type(model_path, model_type):
                     logging.warning(
-                        "Could not load ONNX file %s even "
-                        "though it looks like a ONNX file with error %s. "
-                        "Are you sure it's a ONNX file?",
+                        "Could not load %s file %s even though it looks like a %s file with error %s.",
+                        BACKEND_NAMES[model_type],
                         model_path,
+                        BACKEND_NAMES[model_type],
                         e.__repr__(),
                     )
 
@@ -149,18 +182,101 @@ class Model:
             f"{present} is installed."
         )
 
+    @staticmethod
+    def is_backend_present(model_type: "Model.MODEL_TYPES") -> bool:
+        """Whether the package needed for a backend is installed."""
+        if model_type == Model.MODEL_TYPES.TENSORFLOW:
+            return TF_PRESENT
+        elif model_type == Model.MODEL_TYPES.COREML:
+            return CT_PRESENT
+        elif model_type == Model.MODEL_TYPES.TFLITE:
+            return TFLITE_PRESENT or TF_PRESENT
+        return ONNX_PRESENT
+
+    @staticmethod
+    def probe_order() -> List["Model.MODEL_TYPES"]:
+        """Order in which backends are tried when loading a model.
+        The backend set with the BASIC_PITCH_BACKEND environment variable is tried first.
+        """
+        order = [
+            Model.MODEL_TYPES.TENSORFLOW,
+            Model.MODEL_TYPES.COREML,
+            Model.MODEL_TYPES.TFLITE,
+            Model.MODEL_TYPES.ONNX,
+        ]
+        preferred = get_preferred_backend()
+        if preferred is not None:
+            preferred_model_type = MODEL_TYPES_BY_SUFFIX[preferred]
+            order.remove(preferred_model_type)
+            order.insert(0, preferred_model_type)
+        return order
+
+    def _load(self, model_type: "Model.MODEL_TYPES", model_path: Union[pathlib.Path, str]) -> None:
+        """Load a model with a single backend, importing the backend on first use."""
+        if model_type == Model.MODEL_TYPES.TENSORFLOW:
+            import tensorflow as tf
+
+            try:
+                if self.num_threads is not None:
+                    tf.config.threading.set_intra_op_parallelism_threads(self.num_threads)
+                if self.inter_op_num_threads is not None:
+                    tf.config.threading.set_inter_op_parallelism_threads(self.inter_op_num_threads)
+            except RuntimeError as e:
+                # TensorFlow's thread pools can only be configured before it is initialized
+                logging.warning("Could not set TensorFlow thread counts: %s", e.__repr__())
+            self.model = tf.saved_model.load(str(model_path))
+        elif model_type == Model.MODEL_TYPES.COREML:
+            import coremltools as ct
+
+            self.model = ct.models.MLModel(str(model_path))
+        elif model_type == Model.MODEL_TYPES.TFLITE:
+            if TFLITE_PRESENT:
+                import tflite_runtime.interpreter as tflite
+            else:
+                import tensorflow.lite as tflite
+
+            self.interpreter = tflite.Interpreter(str(model_path), num_threads=self.num_threads)
+            self.model = self.interpreter.get_signature_runner()
+        elif model_type == Model.MODEL_TYPES.ONNX:
+            import onnxruntime as ort
+
+            session_options = ort.SessionOptions()
+            if self.num_threads is not None:
+                session_options.intra_op_num_threads = self.num_threads
+            if self.inter_op_num_threads is not None:
+                session_options.inter_op_num_threads = self.inter_op_num_threads
+            if self.graph_optimization_level is not None:
+                session_options.graph_optimization_level = getattr(
+                    ort.GraphOptimizationLevel, ONNX_GRAPH_OPTIMIZATION_LEVELS[self.graph_optimization_level]
+                )
+            session_options.enable_cpu_mem_arena = self.enable_cpu_mem_arena
+            session_options.enable_mem_pattern = self.enable_mem_pattern
+            self.model = ort.InferenceSession(
+                str(model_path), sess_options=session_options, providers=["CPUExecutionProvider"]
+            )
+        self.model_type = model_type
+
     def predict(self, x: npt.NDArray[np.float32]) -> Dict[str, npt.NDArray[np.float32]]:
+        """Run the model on a batch of audio windows.
+
+        Args:
+            x: array of shape (n_windows, AUDIO_N_SAMPLES, 1)
+
+        Returns:
+            A dictionary with the note, onset and contour activations, each with a leading n_windows axis.
+        """
         if self.model_type == Model.MODEL_TYPES.TENSORFLOW:
-            return {k: v.numpy() for k, v in cast(tf.keras.Model, self.model(x)).items()}
+            return {k: v.numpy() for k, v in cast("tf.keras.Model", self.model(x)).items()}
         elif self.model_type == Model.MODEL_TYPES.COREML:
             print(f"isfinite: {np.all(np.isfinite(x))}", flush=True)
             print(f"shape: {x.shape}", flush=True)
             print(f"dtype: {x.dtype}", flush=True)
-            result = cast(ct.models.MLModel, self.model).predict({"input_2": x})
+            # the CoreML export has a fixed batch dimension of 1, so evaluate the batch window by window
+            results = [cast("ct.models.MLModel", self.model).predict({"input_2": x[i : i + 1]}) for i in range(len(x))]
             return {
-                "note": result["Identity_1"],
-                "onset": result["Identity_2"],
-                "contour": result["Identity"],
+                "note": np.concatenate([result["Identity_1"] for result in results]),
+                "onset": np.concatenate([result["Identity_2"] for result in results]),
+                "contour": np.concatenate([result["Identity"] for result in results]),
             }
         elif self.model_type == Model.MODEL_TYPES.TFLITE:
             return self.model(input_2=x)  # type: ignore
@@ -169,7 +285,7 @@ class Model:
                 k: v
                 for k, v in zip(
                     ["note", "onset", "contour"],
-                    cast(ort.InferenceSession, self.model).run(
+                    cast("ort.InferenceSession", self.model).run(
                         [
                             "StatefulPartitionedCall:1",
                             "StatefulPartitionedCall:2",
@@ -181,41 +297,272 @@ class Model:
             }
 
 
+BACKEND_NAMES = {
+    Model.MODEL_TYPES.TENSORFLOW: "TensorFlow",
+    Model.MODEL_TYPES.COREML: "CoreML",
+    Model.MODEL_TYPES.TFLITE: "TensorFlowLite",
+    Model.MODEL_TYPES.ONNX: "ONNX",
+}
+
+MODEL_TYPES_BY_SUFFIX = {
+    FilenameSuffix.tf: Model.MODEL_TYPES.TENSORFLOW,
+    FilenameSuffix.coreml: Model.MODEL_TYPES.COREML,
+    FilenameSuffix.tflite: Model.MODEL_TYPES.TFLITE,
+    FilenameSuffix.onnx: Model.MODEL_TYPES.ONNX,
+}
+
+# names of onnxruntime.GraphOptimizationLevel members
+ONNX_GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+
+def _looks_like_model_type(model_path: Union[pathlib.Path, str], model_type: Model.MODEL_TYPES) -> bool:
+    """Whether a path looks like a model serialized for the given backend."""
+    if model_type == Model.MODEL_TYPES.TENSORFLOW:
+        return os.path.isdir(model_path) and bool({"saved_model.pb", "variables"} & set(os.listdir(model_path)))
+    elif model_type == Model.MODEL_TYPES.COREML:
+        return str(model_path).endswith(".mlpackage")
+    elif model_type == Model.MODEL_TYPES.TFLITE:
+        return str(model_path).endswith(".tflite")
+    return str(model_path).endswith(".onnx")
+
+
 def window_audio_file(
     audio_original: npt.NDArray[np.float32], hop_size: int
-) -> Iterable[Tuple[npt.NDArray[np.float32], Dict[str, float]]]:
+) -> Tuple[npt.NDArray[np.float32], List[Dict[str, float]]]:
     """
     Pad appropriately an audio file, and return as
     windowed signal, with window length = AUDIO_N_SAMPLES
 
+    The windows are strided views into a single zero padded copy of the signal,
+    so no per-window arrays are allocated.
+
     Returns:
         audio_windowed: tensor with shape (n_windows, AUDIO_N_SAMPLES, 1)
             audio windowed into fixed length chunks
         window_times: list of {'start':.., 'end':...} objects (times in seconds)
 
     """
-    for i in range(0, audio_original.shape[0], hop_size):
-        window = audio_original[i : i + AUDIO_N_SAMPLES]
-        if len(window) < AUDIO_N_SAMPLES:
-            window = np.pad(
-                window,
-                pad_width=[[0, AUDIO_N_SAMPLES - len(window)]],
-            )
-        t_start = float(i) / AUDIO_SAMPLE_RATE
-        window_time = {
-            "start": t_start,
-            "end": t_start + (AUDIO_N_SAMPLES / AUDIO_SAMPLE_RATE),
+    return window_padded_audio(audio_original, 0, hop_size)
+
+
+def window_padded_audio(
+    audio_original: npt.NDArray[np.float32], n_pad_start: int, hop_size: int
+) -> Tuple[npt.NDArray[np.float32], List[Dict[str, float]]]:
+    """
+    Prepend n_pad_start zeros to an audio signal and window it, with window length = AUDIO_N_SAMPLES.
+    The tail is zero padded so that the last window is complete.
+
+    Returns:
+        audio_windowed: read-only view with shape (n_windows, AUDIO_N_SAMPLES, 1)
+        window_times: list of {'start':.., 'end':...} objects (times in seconds)
+
+    """
+    n_samples = n_pad_start + audio_original.shape[0]
+    n_windows = int(np.ceil(n_samples / hop_size))
+    if n_windows == 0:
+        return np.zeros((0, AUDIO_N_SAMPLES, 1), dtype=audio_original.dtype), []
+    audio_padded = np.zeros(((n_windows - 1) * hop_size + AUDIO_N_SAMPLES,), dtype=audio_original.dtype)
+    audio_padded[n_pad_start:n_samples] = audio_original
+
+    audio_windowed = sliding_window_view(audio_padded, AUDIO_N_SAMPLES)[::hop_size, :, np.newaxis]
+    window_times = [
+        {
+            "start": float(i * hop_size) / AUDIO_SAMPLE_RATE,
+            "end": float(i * hop_size) / AUDIO_SAMPLE_RATE + (AUDIO_N_SAMPLES / AUDIO_SAMPLE_RATE),
         }
-        yield np.expand_dims(window, axis=-1), window_time
+        for i in range(n_windows)
+    ]
+    return audio_windowed, window_times
+
+
+def load_audio(
+    audio_path: Union[pathlib.Path, str, BinaryIO], resample_quality: str = DEFAULT_RESAMPLE_QUALITY
+) -> npt.NDArray[np.float32]:
+    """Read an audio file as mono at the model sample rate.
+
+    Args:
+        audio_path: Path to an audio file, or a binary file-like object holding one.
+        resample_quality: soxr quality preset, one of RESAMPLE_QUALITIES.
+
+    Returns:
+        The audio signal, with shape (n_samples,), sampled at AUDIO_SAMPLE_RATE.
+    """
+    return np.concatenate(list(iter_audio_blocks(audio_path, resample_quality=resample_quality)))
+
+
+def resampled_length(n_samples: int, sample_rate: int) -> int:
+    """Number of samples a signal has once resampled to AUDIO_SAMPLE_RATE, as returned by librosa.load.
+
+    Args:
+        n_samples: Number of samples at the original sample rate.
+        sample_rate: The original sample rate.
+
+    Returns:
+        The number of samples at AUDIO_SAMPLE_RATE.
+    """
+    return int(np.ceil(n_samples * AUDIO_SAMPLE_RATE / sample_rate))
+
+
+def _is_file_like(audio: Any) -> bool:
+    return hasattr(audio, "read")
+
+
+def _describe_audio(audio: Any) -> str:
+    """Name of an audio input for progress messages."""
+    if isinstance(audio, np.ndarray):
+        return f"audio signal ({audio.shape[0]} samples)"
+    if _is_file_like(audio):
+        return str(getattr(audio, "name", "audio buffer"))
+    return str(audio)
+
+
+def get_audio_length(audio_path: Union[pathlib.Path, str, BinaryIO]) -> Optional[int]:
+    """Read the length an audio file will have once loaded, without decoding it.
+
+    Args:
+        audio_path: Path to an audio file, or a binary file-like object holding one.
+            The position of a file-like object is restored after reading the header.
+
+    Returns:
+        The number of samples at AUDIO_SAMPLE_RATE, or None if soundfile cannot read the file header.
+    """
+    if not _is_file_like(audio_path):
+        audio_path = str(audio_path)
+    elif not audio_path.seekable():
+        return None
+    position = audio_path.tell() if _is_file_like(audio_path) else None
+    try:
+        info = soundfile.info(audio_path)
+    except (RuntimeError, soundfile.SoundFileError):
+        return None
+    finally:
+        if position is not None:
+            audio_path.seek(position)
+    return resampled_length(info.frames, info.samplerate)
+
+
+def iter_audio_blocks(
+    audio_path: Union[pathlib.Path, str, BinaryIO],
+    block_size: int = AUDIO_READ_BLOCK_SIZE,
+    resample_quality: str = DEFAULT_RESAMPLE_QUALITY,
+) -> Iterator[npt.NDArray[np.float32]]:
+    """Read an audio file block by block, as mono at the model sample rate.
+
+    Blocks are decoded with soundfile and resampled with a streaming resampler, so
+    memory does not grow with the length of the file. Audio already at AUDIO_SAMPLE_RATE
+    is not resampled, and integer ratios such as 44.1 kHz use soxr's polyphase decimation.
+    Formats soundfile cannot read are loaded in full with librosa and yielded as a single block.
+
+    Args:
+        audio_path: Path to an audio file, or a seekable binary file-like object holding one.
+        block_size: Number of samples (at the file's sample rate) read per block.
+        resample_quality: soxr quality preset, one of RESAMPLE_QUALITIES.
+
+    Yields:
+        Consecutive blocks of the audio signal, sampled at AUDIO_SAMPLE_RATE.
+    """
+    assert resample_quality in RESAMPLE_QUALITIES, "resample_quality must be one of {}, got {}".format(
+        RESAMPLE_QUALITIES, resample_quality
+    )
+    if not _is_file_like(audio_path):
+        audio_path = str(audio_path)
+    position = audio_path.tell() if _is_file_like(audio_path) else None
+    try:
+        sound_file = soundfile.SoundFile(audio_path)
+    except (RuntimeError, soundfile.SoundFileError):
+        if position is not None:
+            audio_path.seek(position)
+        audio_original, _ = librosa.load(
+            audio_path, sr=AUDIO_SAMPLE_RATE, mono=True, res_type=f"soxr_{resample_quality.lower()}"
+        )
+        yield audio_original
+        return
+
+    with sound_file:
+        resampler = (
+            soxr.ResampleStream(
+                sound_file.samplerate, AUDIO_SAMPLE_RATE, 1, dtype="float32", quality=resample_quality
+            )
+            if sound_file.samplerate != AUDIO_SAMPLE_RATE
+            else None
+        )
+        n_samples_out = 0
+        for block in sound_file.blocks(blocksize=block_size, dtype="float32", always_2d=True):
+            block = np.mean(block, axis=1)
+            if resampler is not None:
+                block = resampler.resample_chunk(block)
+            n_samples_out += block.shape[0]
+            yield block
+        if resampler is not None:
+            block = resampler.resample_chunk(np.zeros((0,), dtype=np.float32), last=True)
+            # match the output length of librosa.load
+            n_samples_expected = resampled_length(sound_file.frames, sound_file.samplerate)
+            n_samples_out += block.shape[0]
+            yield np.pad(block, [[0, max(0, n_samples_expected - n_samples_out)]])
+
+
+def window_audio_blocks(
+    audio_blocks: Iterable[npt.NDArray[np.float32]], overlap_len: int, hop_size: int, batch_size: int
+) -> Iterator[Tuple[npt.NDArray[np.float32], int]]:
+    """Window a stream of audio blocks, with window length = AUDIO_N_SAMPLES.
+
+    Produces the same windows as get_audio_input, but only buffers the samples
+    needed for the next batch of windows.
+
+    Args:
+        audio_blocks: Consecutive blocks of a mono signal sampled at AUDIO_SAMPLE_RATE.
+        overlap_len: Number of samples consecutive windows overlap by.
+        hop_size: Number of samples between the starts of consecutive windows.
+        batch_size: Maximum number of windows per yielded batch.
+
+    Yields:
+        audio_windowed: tensor with shape (n_windows, AUDIO_N_SAMPLES, 1), with n_windows <= batch_size
+        audio_original_length: number of samples read so far. For the last batch,
+            this is the length of the original audio.
+    """
+    assert overlap_len % 2 == 0, "overlap_length must be even, got {}".format(overlap_len)
+
+    buffer = np.zeros((overlap_len // 2,), dtype=np.float32)
+    n_samples = 0
+    batch_len = (batch_size - 1) * hop_size + AUDIO_N_SAMPLES
+    for block in audio_blocks:
+        buffer = np.concatenate([buffer, block])
+        n_samples += block.shape[0]
+        while buffer.shape[0] >= batch_len:
+            audio_windowed = sliding_window_view(buffer[:batch_len], AUDIO_N_SAMPLES)[::hop_size, :, np.newaxis]
+            yield np.ascontiguousarray(audio_windowed), n_samples
+            buffer = buffer[batch_size * hop_size :]
+
+    if buffer.shape[0] == 0:
+        return
+    # the remaining windows are zero padded at the end
+    audio_windowed, _ = window_padded_audio(buffer, 0, hop_size)
+    for i in range(0, audio_windowed.shape[0], batch_size):
+        yield np.ascontiguousarray(audio_windowed[i : i + batch_size]), n_samples
 
 
 def get_audio_input(
-    audio_path: Union[pathlib.Path, str], overlap_len: int, hop_size: int
-) -> Iterable[Tuple[npt.NDArray[np.float32], Dict[str, float], int]]:
+    audio_path: Union[pathlib.Path, str, BinaryIO, npt.NDArray[np.float32]],
+    overlap_len: int,
+    hop_size: int,
+    resample_quality: str = DEFAULT_RESAMPLE_QUALITY,
+) -> Tuple[npt.NDArray[np.float32], List[Dict[str, float]], int]:
     """
     Read wave file (as mono), pad appropriately, and return as
     windowed signal, with window length = AUDIO_N_SAMPLES
 
+    Args:
+        audio_path: Path to an audio file, a binary file-like object holding one, or an already
+            loaded mono signal sampled at AUDIO_SAMPLE_RATE.
+        overlap_len: Number of samples consecutive windows overlap by.
+        hop_size: Number of samples between the starts of consecutive windows.
+        resample_quality: soxr quality preset used when resampling an audio file.
+
     Returns:
         audio_windowed: tensor with shape (n_windows, AUDIO_N_SAMPLES, 1)
             audio windowed into fixed length chunks
@@ -226,12 +573,14 @@ def get_audio_input(
     """
     assert overlap_len % 2 == 0, "overlap_length must be even, got {}".format(overlap_len)
 
-    audio_original, _ = librosa.load(str(audio_path), sr=AUDIO_SAMPLE_RATE, mono=True)
+    if isinstance(audio_path, np.ndarray):
+        audio_original = audio_path
+    else:
+        audio_original = load_audio(audio_path, resample_quality)
 
     original_length = audio_original.shape[0]
-    audio_original = np.concatenate([np.zeros((int(overlap_len / 2),), dtype=np.float32), audio_original])
-    for window, window_time in window_audio_file(audio_original, hop_size):
-        yield np.expand_dims(window, axis=0), window_time, original_length
+    audio_windowed, window_times = window_padded_audio(audio_original, overlap_len // 2, hop_size)
+    return audio_windowed, window_times, original_length
 
 
 def unwrap_output(
@@ -258,22 +607,110 @@ def unwrap_output(
         output = output[:, n_olap:-n_olap, :]
 
     output_shape = output.shape
-    n_output_frames_original = int(np.floor(audio_original_length * (ANNOTATIONS_FPS / AUDIO_SAMPLE_RATE)))
+    n_output_frames_original = n_output_frames(audio_original_length)
     unwrapped_output = output.reshape(output_shape[0] * output_shape[1], output_shape[2])
     return unwrapped_output[:n_output_frames_original, :]  # trim to original audio length
 
 
+def n_output_frames(audio_original_length: int) -> int:
+    """Number of model output frames covering a signal.
+
+    Args:
+        audio_original_length: length of the audio signal (in samples)
+
+    Returns:
+        The number of frames of the unwrapped model output.
+    """
+    return int(np.floor(audio_original_length * (ANNOTATIONS_FPS / AUDIO_SAMPLE_RATE)))
+
+
+class OutputStitcher:
+    """Stitch batched model predictions into single matrices, as `unwrap_output` does.
+
+    The center of each window is written in place into one buffer per output, so the
+    windowed predictions are never concatenated. When the audio length is known up front,
+    the buffers are allocated once for exactly the windows covering it. A known length may
+    only be an estimate (e.g. read from a file header): if more windows arrive, the buffers
+    grow geometrically and `result` copies the trimmed output out of them.
+    """
+
+    def __init__(self, n_overlapping_frames: int, audio_length: Optional[int] = None):
+        """
+        Args:
+            n_overlapping_frames: number of overlapping frames in the output
+            audio_length: expected length of the audio signal (in samples), if known
+        """
+        self.n_olap = int(0.5 * n_overlapping_frames)
+        self.n_windows = 0
+        if audio_length is not None:
+            # the number of windows window_padded_audio splits the signal into
+            overlap_len = n_overlapping_frames * FFT_HOP
+            self.n_windows = int(np.ceil((overlap_len // 2 + audio_length) / (AUDIO_N_SAMPLES - overlap_len)))
+        self.capacity = 0
+        self.n_frames = 0
+        self.buffers: Dict[str, npt.NDArray[np.float32]] = {}
+
+    def append(self, output: Dict[str, npt.NDArray[np.float32]]) -> None:
+        """Write a batch of predictions after the previously appended ones.
+
+        Args:
+            output: dictionary of arrays (n_batches, n_times_short, n_freqs)
+        """
+        n_frames = 0
+        for k, v in output.items():
+            if self.n_olap > 0:
+                # remove half of the overlapping frames from beginning and end
+                v = v[:, self.n_olap : -self.n_olap, :]
+            n_window_frames = v.shape[1]
+            v = v.reshape(v.shape[0] * v.shape[1], v.shape[2])
+            n_frames = v.shape[0]
+            self._reserve(k, v, self.n_frames + n_frames, n_window_frames)
+            self.buffers[k][self.n_frames : self.n_frames + n_frames] = v
+        self.n_frames += n_frames
+
+    def _reserve(self, key: str, output: npt.NDArray[np.float32], n_frames: int, n_window_frames: int) -> None:
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            self.capacity = max(self.capacity, self.n_windows * n_window_frames)
+            self.buffers[key] = np.empty((max(self.capacity, n_frames), output.shape[1]), dtype=output.dtype)
+        elif n_frames > buffer.shape[0]:
+            # the audio length was underestimated, or not known at all
+            grown = np.empty((max(2 * buffer.shape[0], n_frames), buffer.shape[1]), dtype=buffer.dtype)
+            grown[: self.n_frames] = buffer[: self.n_frames]
+            self.buffers[key] = grown
+
+    def result(self, audio_original_length: int) -> Dict[str, npt.NDArray[np.float32]]:
+        """Get the stitched predictions.
+
+        Args:
+            audio_original_length: length of original audio signal (in samples)
+
+        Returns:
+            dictionary of arrays (n_times, n_freqs)
+        """
+        n_frames = min(n_output_frames(audio_original_length), self.n_frames)
+        # trim to original audio length, without keeping a geometrically grown buffer alive
+        return {
+            k: v[:n_frames] if v.shape[0] <= self.capacity else v[:n_frames].copy() for k, v in self.buffers.items()
+        }
+
+
 def run_inference(
-    audio_path: Union[pathlib.Path, str],
+    audio_path: Union[pathlib.Path, str, BinaryIO, npt.NDArray[np.float32]],
     model_or_model_path: Union[Model, pathlib.Path, str],
     debug_file: Optional[pathlib.Path] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    resample_quality: str = DEFAULT_RESAMPLE_QUALITY,
 ) -> Dict[str, np.array]:
     """Run the model on the input audio path.
 
     Args:
-        audio_path: The audio to run inference on.
+        audio_path: The audio file to run inference on, a binary file-like object holding one,
+            or a mono signal already sampled at AUDIO_SAMPLE_RATE.
         model_or_model_path: A loaded Model or path to a serialized model to load.
         debug_file: An optional path to output debug data to. Useful for testing/verification.
+        batch_size: Number of audio windows passed to the model in a single call.
+        resample_quality: soxr quality preset used when resampling an audio file, one of RESAMPLE_QUALITIES.
 
     Returns:
        A dictionary with the notes, onsets and contours from model inference.
@@ -288,20 +725,28 @@ def run_inference(
     overlap_len = n_overlapping_frames * FFT_HOP
     hop_size = AUDIO_N_SAMPLES - overlap_len
 
-    output: Dict[str, Any] = {"note": [], "onset": [], "contour": []}
-    for audio_windowed, _, audio_original_length in get_audio_input(audio_path, overlap_len, hop_size):
-        for k, v in model.predict(audio_windowed).items():
-            output[k].append(v)
+    assert batch_size > 0, "batch_size must be positive, got {}".format(batch_size)
 
-    unwrapped_output = {
-        k: unwrap_output(np.concatenate(output[k]), audio_original_length, n_overlapping_frames) for k in output
-    }
+    if isinstance(audio_path, np.ndarray) or debug_file:
+        audio_windowed, _, audio_original_length = get_audio_input(audio_path, overlap_len, hop_size, resample_quality)
+        output = OutputStitcher(n_overlapping_frames, audio_original_length)
+        for i in range(0, audio_windowed.shape[0], batch_size):
+            output.append(model.predict(np.ascontiguousarray(audio_windowed[i : i + batch_size])))
+    else:
+        # stream the file so that only a few windows of audio are held in memory
+        output = OutputStitcher(n_overlapping_frames, get_audio_length(audio_path))
+        for audio_windowed, audio_original_length in window_audio_blocks(
+            iter_audio_blocks(audio_path, resample_quality=resample_quality), overlap_len, hop_size, batch_size
+        ):
+            output.append(model.predict(audio_windowed))
+
+    unwrapped_output = output.result(audio_original_length)
 
     if debug_file:
         with open(debug_file, "w") as f:
             json.dump(
                 {
-                    "audio_windowed": audio_windowed.numpy().tolist(),
+                    "audio_windowed": audio_windowed.tolist(),
                     "audio_original_length": audio_original_length,
                     "hop_size_samples": hop_size,
                     "overlap_length_samples": overlap_len,
@@ -390,29 +835,117 @@ def build_output_path(
 
 
 def save_note_events(
-    note_events: List[Tuple[float, float, int, float, Optional[List[int]]]],
+    note_events: Union[NoteEvents, List[Tuple[float, float, int, float, Optional[List[int]]]]],
     save_path: Union[pathlib.Path, str],
 ) -> None:
     """Save note events to file
 
     Args:
-        note_events: A list of note event tuples to save. Tuples have the format
-            ("start_time_s", "end_time_s", "pitch_midi", "velocity", "list of pitch bend values")
+        note_events: The note events to save, or a list of note event tuples with the format
+            ("start_time_s", "end_time_s", "pitch_midi", "amplitude", "list of pitch bend values")
         save_path: The location we're saving it
     """
+    if not isinstance(note_events, NoteEvents):
+        note_events = NoteEvents.from_tuples(note_events)
 
+    pitch_bends = note_events.pitch_bends.tolist()
+    pitch_bend_offsets = note_events.pitch_bend_offsets.tolist()
     with open(save_path, "w") as fhandle:
         writer = csv.writer(fhandle, delimiter=",")
         writer.writerow(["start_time_s", "end_time_s", "pitch_midi", "velocity", "pitch_bend"])
-        for start_time, end_time, note_number, amplitude, pitch_bend in note_events:
-            row = [start_time, end_time, note_number, int(np.round(127 * amplitude))]
-            if pitch_bend:
-                row.extend(pitch_bend)
-            writer.writerow(row)
+        writer.writerows(
+            [start_time, end_time, note_number, velocity]
+            + pitch_bends[pitch_bend_offsets[i] : pitch_bend_offsets[i + 1]]
+            for i, (start_time, end_time, note_number, velocity) in enumerate(
+                zip(
+                    note_events.start.tolist(),
+                    note_events.end.tolist(),
+                    note_events.pitch.tolist(),
+                    note_events.velocities().tolist(),
+                )
+            )
+        )
+
+
+def save_model_output(
+    model_output: Dict[str, npt.NDArray[np.float32]],
+    save_path: Union[pathlib.Path, str],
+    precision: str = "float32",
+) -> None:
+    """Save model outputs to an npz file.
+
+    Args:
+        model_output: The model output, with the notes, onsets and contours.
+        save_path: The location we're saving it
+        precision: The storage precision, one of MODEL_OUTPUT_PRECISIONS.
+    """
+    assert precision in MODEL_OUTPUT_PRECISIONS, "precision must be one of {}, got {}".format(
+        MODEL_OUTPUT_PRECISIONS, precision
+    )
+    if precision == "float32":
+        np.savez(save_path, **{k: np.asarray(v, dtype=np.float32) for k, v in model_output.items()})
+    elif precision == "float16":
+        np.savez_compressed(save_path, **{k: v.astype(np.float16) for k, v in model_output.items()})
+    else:
+        # the model outputs are sigmoid activations in [0, 1]
+        np.savez_compressed(
+            save_path, **{k: np.round(np.clip(v, 0, 1) * 255).astype(np.uint8) for k, v in model_output.items()}
+        )
+
+
+def _memmap_npz_member(
+    load_path: Union[pathlib.Path, str], zip_info: zipfile.ZipInfo
+) -> Optional[npt.NDArray[np.float32]]:
+    """Memory-map an array stored uncompressed in an npz file, or return None if it cannot be mapped."""
+    if zip_info.compress_type != zipfile.ZIP_STORED:
+        return None
+    with open(load_path, "rb") as fhandle:
+        # skip the zip local file header, whose name and extra field lengths can differ from the central directory
+        fhandle.seek(zip_info.header_offset + 26)
+        name_length, extra_length = struct.unpack("<HH", fhandle.read(4))
+        fhandle.seek(name_length + extra_length, os.SEEK_CUR)
+        version = np.lib.format.read_magic(fhandle)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(fhandle)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(fhandle)
+        offset = fhandle.tell()
+    if dtype.hasobject or dtype != np.float32:
+        return None
+    # copy-on-write, as note creation may modify its inputs
+    return np.memmap(load_path, dtype=dtype, mode="c", offset=offset, shape=shape, order="F" if fortran_order else "C")
+
+
+def load_model_output(load_path: Union[pathlib.Path, str], mmap: bool = False) -> Dict[str, npt.NDArray[np.float32]]:
+    """Load model outputs saved with `save_model_output`, in any precision.
+
+    Args:
+        load_path: Path to the npz file.
+        mmap: If True, float32 outputs (stored uncompressed by `save_model_output`) are memory-mapped
+            copy-on-write instead of read. float16 and uint8 outputs, which are compressed, and outputs
+            saved by older versions as a pickled dictionary are always read into memory.
+
+    Returns:
+        The model output, with float32 notes, onsets and contours that can be passed to
+        `note_creation.model_output_to_notes`.
+    """
+    with np.load(load_path) as data:
+        if MODEL_OUTPUT_NPZ_KEY not in data.files:
+            model_output = {}
+            for k in data.files:
+                member = _memmap_npz_member(load_path, data.zip.getinfo(f"{k}.npy")) if mmap else None
+                if member is None:
+                    member = data[k]
+                model_output[k] = member.astype(np.float32) / 255 if member.dtype == np.uint8 else member
+            return {k: v if v.dtype == np.float32 else v.astype(np.float32) for k, v in model_output.items()}
+
+    # older versions stored float32 outputs as a pickled dictionary
+    with np.load(load_path, allow_pickle=True) as data:
+        return cast(Dict[str, npt.NDArray[np.float32]], data[MODEL_OUTPUT_NPZ_KEY].item())
 
 
 def predict(
-    audio_path: Union[pathlib.Path, str],
+    audio_path: Union[pathlib.Path, str, BinaryIO, npt.NDArray[np.float32]],
     model_or_model_path: Union[Model, pathlib.Path, str] = ICASSP_2022_MODEL_PATH,
     onset_threshold: float = 0.5,
     frame_threshold: float = 0.3,
@@ -423,15 +956,20 @@ def predict(
     melodia_trick: bool = True,
     debug_file: Optional[pathlib.Path] = None,
     midi_tempo: float = 120,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    cache: Optional[ModelOutputCache] = None,
+    resample_quality: str = DEFAULT_RESAMPLE_QUALITY,
 ) -> Tuple[
     Dict[str, np.array],
     pretty_midi.PrettyMIDI,
-    List[Tuple[float, float, int, float, Optional[List[int]]]],
+    NoteEvents,
 ]:
     """Run a single prediction.
 
     Args:
-        audio_path: File path for the audio to run inference on.
+        audio_path: File path for the audio to run inference on, a binary file-like object holding
+            an audio file (e.g. io.BytesIO of an upload), or a mono signal already sampled at AUDIO_SAMPLE_RATE.
+            In-memory inputs are decoded once and never written to disk.
         model_or_model_path: A loaded Model or path to a serialized model to load.
         onset_threshold: Minimum energy required for an onset to be considered present.
         frame_threshold: Minimum energy requirement for a frame to be considered present.
@@ -441,14 +979,28 @@ def predict(
         multiple_pitch_bends: If True, allow overlapping notes in midi file to have pitch bends.
         melodia_trick: Use the melodia post-processing step.
         debug_file: An optional path to output debug data to. Useful for testing/verification.
+        batch_size: Number of audio windows passed to the model in a single call.
+        cache: An optional cache of model outputs. On a hit, the model is not run.
+            The cache is not used when a debug file is given.
+        resample_quality: soxr quality preset used when resampling the audio, one of RESAMPLE_QUALITIES.
     Returns:
         The model output, midi data and note events from a single prediction
     """
 
     with no_tf_warnings():
-        print(f"Predicting MIDI for {audio_path}...")
+        print(f"Predicting MIDI for {_describe_audio(audio_path)}...")
 
-        model_output = run_inference(audio_path, model_or_model_path, debug_file)
+        model_output = None
+        if cache is not None and not debug_file:
+            model_path = (
+                model_or_model_path.model_path if isinstance(model_or_model_path, Model) else model_or_model_path
+            )
+            cache_key = cache.key(audio_path, model_path, resample_quality)
+            model_output = cache.get(cache_key)
+        if model_output is None:
+            model_output = run_inference(audio_path, model_or_model_path, debug_file, batch_size, resample_quality)
+            if cache is not None and not debug_file:
+                cache.put(cache_key, model_output)
         min_note_len = int(np.round(minimum_note_length / 1000 * (AUDIO_SAMPLE_RATE / FFT_HOP)))
         midi_data, note_events = infer.model_output_to_notes(
             model_output,
@@ -489,6 +1041,244 @@ def predict(
     return model_output, midi_data, note_events
 
 
+def save_outputs(
+    audio_path: Union[pathlib.Path, str],
+    output_directory: Union[pathlib.Path, str],
+    model_output: Dict[str, np.array],
+    midi_data: pretty_midi.PrettyMIDI,
+    note_events: NoteEvents,
+    save_midi: bool,
+    sonify_midi: bool,
+    save_model_outputs: bool,
+    save_notes: bool,
+    sonification_samplerate: int = 44100,
+    model_output_precision: str = "float32",
+) -> None:
+    """Save the results of a single prediction to file.
+
+    Args:
+        audio_path: File path of the audio the prediction was made for.
+        output_directory: Directory to output MIDI and all other outputs derived from the model to.
+        model_output: The model output of the prediction.
+        midi_data: The midi data of the prediction.
+        note_events: The note events of the prediction.
+        save_midi: True to save midi.
+        sonify_midi: Whether or not to render audio from the MIDI and output it to a file.
+        save_model_outputs: True to save contours, onsets and notes from the model prediction.
+        save_notes: True to save note events.
+        sonification_samplerate: Sample rate for rendering audio from MIDI.
+        model_output_precision: Storage precision of the saved model outputs, one of MODEL_OUTPUT_PRECISIONS.
+    """
+    if save_model_outputs:
+        model_output_path = build_output_path(audio_path, output_directory, OutputExtensions.MODEL_OUTPUT_NPZ)
+        try:
+            save_model_output(model_output, model_output_path, model_output_precision)
+            file_saved_confirmation(OutputExtensions.MODEL_OUTPUT_NPZ.name, model_output_path)
+        except Exception as e:
+            failed_to_save(OutputExtensions.MODEL_OUTPUT_NPZ.name, model_output_path)
+            raise e
+
+    if save_midi:
+        try:
+            midi_path = build_output_path(audio_path, output_directory, OutputExtensions.MIDI)
+        except IOError as e:
+            raise e
+        try:
+            midi_data.write(str(midi_path))
+            file_saved_confirmation(OutputExtensions.MIDI.name, midi_path)
+        except Exception as e:
+            failed_to_save(OutputExtensions.MIDI.name, midi_path)
+            raise e
+
+    if sonify_midi:
+        midi_sonify_path = build_output_path(audio_path, output_directory, OutputExtensions.MIDI_SONIFICATION)
+        try:
+            infer.sonify_midi(midi_data, midi_sonify_path, sr=sonification_samplerate)
+            file_saved_confirmation(OutputExtensions.MIDI_SONIFICATION.name, midi_sonify_path)
+        except Exception as e:
+            failed_to_save(OutputExtensions.MIDI_SONIFICATION.name, midi_sonify_path)
+            raise e
+
+    if save_notes:
+        note_events_path = build_output_path(audio_path, output_directory, OutputExtensions.NOTE_EVENTS)
+        try:
+            save_note_events(note_events, note_events_path)
+            file_saved_confirmation(OutputExtensions.NOTE_EVENTS.name, note_events_path)
+        except Exception as e:
+            failed_to_save(OutputExtensions.NOTE_EVENTS.name, note_events_path)
+            raise e
+
+
+def decode_model_output(
+    model_output_path: Union[pathlib.Path, str],
+    output_directory: Union[pathlib.Path, str],
+    save_midi: bool,
+    sonify_midi: bool,
+    save_notes: bool,
+    onset_threshold: float = 0.5,
+    frame_threshold: float = 0.3,
+    minimum_note_length: float = 127.70,
+    minimum_frequency: Optional[float] = None,
+    maximum_frequency: Optional[float] = None,
+    multiple_pitch_bends: bool = False,
+    melodia_trick: bool = True,
+    sonification_samplerate: int = 44100,
+    midi_tempo: float = 120,
+    mmap: bool = False,
+) -> None:
+    """Create notes from a saved model output and save the results to file, without running the model.
+
+    Args:
+        model_output_path: Path to a model output npz file, as saved by `predict_and_save`.
+        output_directory: Directory to output MIDI and all other outputs derived from the model to.
+        save_midi: True to save midi.
+        sonify_midi: Whether or not to render audio from the MIDI and output it to a file.
+        save_notes: True to save note events.
+        onset_threshold: Minimum energy required for an onset to be considered present.
+        frame_threshold: Minimum energy requirement for a frame to be considered present.
+        minimum_note_length: The minimum allowed note length in milliseconds.
+        minimum_freq: Minimum allowed output frequency, in Hz. If None, all frequencies are used.
+        maximum_freq: Maximum allowed output frequency, in Hz. If None, all frequencies are used.
+        multiple_pitch_bends: If True, allow overlapping notes in midi file to have pitch bends.
+        melodia_trick: Use the melodia post-processing step.
+        sonification_samplerate: Sample rate for rendering audio from MIDI.
+        midi_tempo: The tempo for the midi file.
+        mmap: If True, memory-map the model output when it is stored uncompressed.
+    """
+    print(f"Decoding MIDI from {model_output_path}...")
+    model_output = load_model_output(model_output_path, mmap)
+
+    min_note_len = int(np.round(minimum_note_length / 1000 * (AUDIO_SAMPLE_RATE / FFT_HOP)))
+    midi_data, note_events = infer.model_output_to_notes(
+        model_output,
+        onset_thresh=onset_threshold,
+        frame_thresh=frame_threshold,
+        min_note_len=min_note_len,  # convert to frames
+        min_freq=minimum_frequency,
+        max_freq=maximum_frequency,
+        multiple_pitch_bends=multiple_pitch_bends,
+        melodia_trick=melodia_trick,
+        midi_tempo=midi_tempo,
+    )
+
+    # name the outputs after the original audio file
+    stem = pathlib.Path(model_output_path).stem
+    if stem.endswith("_basic_pitch"):
+        stem = stem[: -len("_basic_pitch")]
+    save_outputs(
+        f"{stem}.{OutputExtensions.MODEL_OUTPUT_NPZ.value}",  # build_output_path strips one extension
+        output_directory,
+        model_output,
+        midi_data,
+        note_events,
+        save_midi,
+        sonify_midi,
+        False,
+        save_notes,
+        sonification_samplerate,
+    )
+
+
+def decode_and_save(
+    model_output_path_list: Sequence[Union[pathlib.Path, str]],
+    output_directory: Union[pathlib.Path, str],
+    save_midi: bool,
+    sonify_midi: bool,
+    save_notes: bool,
+    onset_threshold: float = 0.5,
+    frame_threshold: float = 0.3,
+    minimum_note_length: float = 127.70,
+    minimum_frequency: Optional[float] = None,
+    maximum_frequency: Optional[float] = None,
+    multiple_pitch_bends: bool = False,
+    melodia_trick: bool = True,
+    sonification_samplerate: int = 44100,
+    midi_tempo: float = 120,
+    n_workers: int = 0,
+    mmap: bool = False,
+) -> None:
+    """Create notes from saved model outputs and save the results to file, without running the model.
+
+    Args:
+        model_output_path_list: List of paths to model output npz files, as saved by `predict_and_save`.
+        output_directory: Directory to output MIDI and all other outputs derived from the model to.
+        save_midi: True to save midi.
+        sonify_midi: Whether or not to render audio from the MIDI and output it to a file.
+        save_notes: True to save note events.
+        onset_threshold: Minimum energy required for an onset to be considered present.
+        frame_threshold: Minimum energy requirement for a frame to be considered present.
+        minimum_note_length: The minimum allowed note length in milliseconds.
+        minimum_freq: Minimum allowed output frequency, in Hz. If None, all frequencies are used.
+        maximum_freq: Maximum allowed output frequency, in Hz. If None, all frequencies are used.
+        multiple_pitch_bends: If True, allow overlapping notes in midi file to have pitch bends.
+        melodia_trick: Use the melodia post-processing step.
+        sonification_samplerate: Sample rate for rendering audio from MIDI.
+        midi_tempo: The tempo for the midi file.
+        n_workers: Number of processes decoding files in parallel. If 0, files are decoded in the calling process.
+        mmap: If True, memory-map model outputs that are stored uncompressed.
+    """
+    decode = functools.partial(
+        decode_model_output,
+        output_directory=output_directory,
+        save_midi=save_midi,
+        sonify_midi=sonify_midi,
+        save_notes=save_notes,
+        onset_threshold=onset_threshold,
+        frame_threshold=frame_threshold,
+        minimum_note_length=minimum_note_length,
+        minimum_frequency=minimum_frequency,
+        maximum_frequency=maximum_frequency,
+        multiple_pitch_bends=multiple_pitch_bends,
+        melodia_trick=melodia_trick,
+        sonification_samplerate=sonification_samplerate,
+        midi_tempo=midi_tempo,
+        mmap=mmap,
+    )
+    if n_workers <= 0:
+        for model_output_path in model_output_path_list:
+            print("")
+            decode(model_output_path)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) as pool:
+        for _ in pool.map(decode, model_output_path_list):
+            pass
+
+
+def iter_loaded_audio(
+    audio_path_list: Sequence[Union[pathlib.Path, str]],
+    n_workers: int = 0,
+    resample_quality: str = DEFAULT_RESAMPLE_QUALITY,
+) -> Iterator[Tuple[pathlib.Path, npt.NDArray[np.float32]]]:
+    """Load audio files in order, decoding and resampling them in a process pool.
+
+    Args:
+        audio_path_list: List of file paths for the audio to load.
+        n_workers: Number of worker processes. If 0, files are loaded in the calling process.
+        resample_quality: soxr quality preset used when resampling, one of RESAMPLE_QUALITIES.
+
+    Yields:
+        Tuples of the audio path and the loaded audio signal, in the order of audio_path_list.
+    """
+    audio_paths = iter([pathlib.Path(audio_path) for audio_path in audio_path_list])
+    if n_workers <= 0:
+        for audio_path in audio_paths:
+            yield audio_path, load_audio(audio_path, resample_quality)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) as pool:
+        # keep a bounded number of decoded files in flight so memory does not grow with the file list
+        pending = collections.deque(
+            (audio_path, pool.submit(load_audio, audio_path, resample_quality))
+            for audio_path in itertools.islice(audio_paths, 2 * n_workers)
+        )
+        while pending:
+            audio_path, future = pending.popleft()
+            for next_audio_path in itertools.islice(audio_paths, 1):
+                pending.append((next_audio_path, pool.submit(load_audio, next_audio_path, resample_quality)))
+            yield audio_path, future.result()
+
+
 def predict_and_save(
     audio_path_list: Sequence[Union[pathlib.Path, str]],
     output_directory: Union[pathlib.Path, str],
@@ -507,9 +1297,19 @@ def predict_and_save(
     debug_file: Optional[pathlib.Path] = None,
     sonification_samplerate: int = 44100,
     midi_tempo: float = 120,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    n_audio_workers: int = 0,
+    n_output_workers: int = 0,
+    cache: Optional[ModelOutputCache] = None,
+    resample_quality: str = DEFAULT_RESAMPLE_QUALITY,
+    model_output_precision: str = "float32",
 ) -> None:
     """Make a prediction and save the results to file.
 
+    If n_audio_workers or n_output_workers is set, files are processed as a pipeline: audio is
+    decoded in a process pool, inference runs on a single shared model, and note creation and
+    file writing for one file overlap with inference of the next.
+
     Args:
         audio_path_list: List of file paths for the audio to run inference on.
         output_directory: Directory to output MIDI and all other outputs derived from the model to.
@@ -526,11 +1326,18 @@ def predict_and_save(
         multiple_pitch_bends: If True, allow overlapping notes in midi file to have pitch bends.
         melodia_trick: Use the melodia post-processing step.
         debug_file: An optional path to output debug data to. Useful for testing/verification.
+            Files are processed sequentially when a debug file is given.
         sonification_samplerate: Sample rate for rendering audio from MIDI.
+        batch_size: Number of audio windows passed to the model in a single call.
+        n_audio_workers: Number of processes decoding audio files ahead of inference.
+        n_output_workers: Number of threads creating notes and writing output files.
+        cache: An optional cache of model outputs. Files with a cached model output are not run through the model.
+        resample_quality: soxr quality preset used when resampling the audio, one of RESAMPLE_QUALITIES.
+        model_output_precision: Storage precision of the saved model outputs, one of MODEL_OUTPUT_PRECISIONS.
     """
-    for audio_path in audio_path_list:
-        print("")
-        try:
+    if (n_audio_workers <= 0 and n_output_workers <= 0) or debug_file:
+        for audio_path in audio_path_list:
+            print("")
             model_output, midi_data, note_events = predict(
                 pathlib.Path(audio_path),
                 model_or_model_path,
@@ -543,45 +1350,94 @@ def predict_and_save(
                 melodia_trick,
                 debug_file,
                 midi_tempo,
+                batch_size,
+                cache,
+                resample_quality,
             )
+            save_outputs(
+                audio_path,
+                output_directory,
+                model_output,
+                midi_data,
+                note_events,
+                save_midi,
+                sonify_midi,
+                save_model_outputs,
+                save_notes,
+                sonification_samplerate,
+                model_output_precision,
+            )
+        return
 
-            if save_model_outputs:
-                model_output_path = build_output_path(audio_path, output_directory, OutputExtensions.MODEL_OUTPUT_NPZ)
-                try:
-                    np.savez(model_output_path, basic_pitch_model_output=model_output)
-                    file_saved_confirmation(OutputExtensions.MODEL_OUTPUT_NPZ.name, model_output_path)
-                except Exception as e:
-                    failed_to_save(OutputExtensions.MODEL_OUTPUT_NPZ.name, model_output_path)
-                    raise e
-
-            if save_midi:
-                try:
-                    midi_path = build_output_path(audio_path, output_directory, OutputExtensions.MIDI)
-                except IOError as e:
-                    raise e
-                try:
-                    midi_data.write(str(midi_path))
-                    file_saved_confirmation(OutputExtensions.MIDI.name, midi_path)
-                except Exception as e:
-                    failed_to_save(OutputExtensions.MIDI.name, midi_path)
-                    raise e
-
-            if sonify_midi:
-                midi_sonify_path = build_output_path(audio_path, output_directory, OutputExtensions.MIDI_SONIFICATION)
-                try:
-                    infer.sonify_midi(midi_data, midi_sonify_path, sr=sonification_samplerate)
-                    file_saved_confirmation(OutputExtensions.MIDI_SONIFICATION.name, midi_sonify_path)
-                except Exception as e:
-                    failed_to_save(OutputExtensions.MIDI_SONIFICATION.name, midi_sonify_path)
-                    raise e
-
-            if save_notes:
-                note_events_path = build_output_path(audio_path, output_directory, OutputExtensions.NOTE_EVENTS)
-                try:
-                    save_note_events(note_events, note_events_path)
-                    file_saved_confirmation(OutputExtensions.NOTE_EVENTS.name, note_events_path)
-                except Exception as e:
-                    failed_to_save(OutputExtensions.NOTE_EVENTS.name, note_events_path)
-                    raise e
-        except Exception as e:
-            raise e
+    if isinstance(model_or_model_path, Model):
+        model = model_or_model_path
+    else:
+        model = Model(model_or_model_path)
+    min_note_len = int(np.round(minimum_note_length / 1000 * (AUDIO_SAMPLE_RATE / FFT_HOP)))
+
+    def create_notes_and_save(audio_path: pathlib.Path, model_output: Dict[str, np.array]) -> None:
+        midi_data, note_events = infer.model_output_to_notes(
+            model_output,
+            onset_thresh=onset_threshold,
+            frame_thresh=frame_threshold,
+            min_note_len=min_note_len,  # convert to frames
+            min_freq=minimum_frequency,
+            max_freq=maximum_frequency,
+            multiple_pitch_bends=multiple_pitch_bends,
+            melodia_trick=melodia_trick,
+            midi_tempo=midi_tempo,
+        )
+        save_outputs(
+            audio_path,
+            output_directory,
+            model_output,
+            midi_data,
+            note_events,
+            save_midi,
+            sonify_midi,
+            save_model_outputs,
+            save_notes,
+            sonification_samplerate,
+            model_output_precision,
+        )
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, n_output_workers)) as output_pool:
+        pending: Deque[concurrent.futures.Future] = collections.deque()
+
+        def submit(audio_path: pathlib.Path, model_output: Dict[str, np.array]) -> None:
+            if n_output_workers <= 0:
+                create_notes_and_save(audio_path, model_output)
+                return
+            # bound the number of model outputs waiting to be written
+            while len(pending) >= 2 * n_output_workers:
+                pending.popleft().result()
+            pending.append(output_pool.submit(create_notes_and_save, audio_path, model_output))
+
+        # files with a cached model output skip audio loading and inference entirely
+        uncached_audio_paths = []
+        cache_keys = {}
+        for audio_path in audio_path_list:
+            audio_path = pathlib.Path(audio_path)
+            if cache is None:
+                uncached_audio_paths.append(audio_path)
+                continue
+            cache_keys[audio_path] = cache.key(audio_path, model.model_path, resample_quality)
+            model_output = cache.get(cache_keys[audio_path])
+            if model_output is None:
+                uncached_audio_paths.append(audio_path)
+                continue
+            print("")
+            print(f"Using cached model output for {audio_path}...")
+            submit(audio_path, model_output)
+
+        for audio_path, audio in iter_loaded_audio(uncached_audio_paths, n_audio_workers, resample_quality):
+            print("")
+            print(f"Predicting MIDI for {audio_path}...")
+            with no_tf_warnings():
+                model_output = run_inference(audio, model, batch_size=batch_size)
+            if cache is not None:
+                cache.put(cache_keys[audio_path], model_output)
+            submit(audio_path, model_output)
+
+        while pending:
+            pending.popleft().result()
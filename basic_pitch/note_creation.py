@@ -15,11 +15,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import concurrent.futures
+import itertools
 import pathlib
 from collections import defaultdict
-from typing import DefaultDict, Dict, List, Optional, Tuple, Union
+from typing import DefaultDict, Dict, Iterable, List, Optional, Tuple, Union
 import mir_eval
 import librosa
+import numba
 import resampy
 import numpy as np
 import pretty_midi
@@ -34,13 +37,15 @@ from basic_pitch.constants import (
     ANNOT_N_FRAMES,
     CONTOURS_BINS_PER_SEMITONE,
     FFT_HOP,
-    N_FREQ_BINS_CONTOURS,
 )
+from basic_pitch.note_events import NoteEvents
 
 MIDI_OFFSET = 21
 SONIFY_FS = 3000
 N_PITCH_BEND_TICKS = 8192
 MAX_FREQ_IDX = 87
+# number of note frames gathered at once when estimating pitch bends
+PITCH_BEND_CHUNK_FRAMES = 2**16
 
 
 def model_output_to_notes(
@@ -55,7 +60,7 @@ def model_output_to_notes(
     multiple_pitch_bends: bool = False,
     melodia_trick: bool = True,
     midi_tempo: float = 120,
-) -> Tuple[pretty_midi.PrettyMIDI, List[Tuple[float, float, int, float, Optional[List[int]]]]]:
+) -> Tuple[pretty_midi.PrettyMIDI, NoteEvents]:
     """Convert model output to MIDI
 
     Args:
@@ -77,7 +82,7 @@ def model_output_to_notes(
 
     Returns:
         midi : pretty_midi.PrettyMIDI object
-        note_events: A list of note event tuples (start_time_s, end_time_s, pitch_midi, amplitude)
+        note_events: The note events, iterable as tuples (start_time_s, end_time_s, pitch_midi, amplitude, pitch_bends)
     """
     frames = output["note"]
     onsets = output["onset"]
@@ -97,12 +102,9 @@ def model_output_to_notes(
     if include_pitch_bends:
         estimated_notes_with_pitch_bend = get_pitch_bends(contours, estimated_notes)
     else:
-        estimated_notes_with_pitch_bend = [(note[0], note[1], note[2], note[3], None) for note in estimated_notes]
+        estimated_notes_with_pitch_bend = estimated_notes
 
-    times_s = model_frames_to_time(contours.shape[0])
-    estimated_notes_time_seconds = [
-        (times_s[note[0]], times_s[note[1]], note[2], note[3], note[4]) for note in estimated_notes_with_pitch_bend
-    ]
+    estimated_notes_time_seconds = note_frames_to_time(estimated_notes_with_pitch_bend, contours.shape[0])
 
     return (
         note_events_to_midi(estimated_notes_time_seconds, multiple_pitch_bends, midi_tempo),
@@ -173,9 +175,7 @@ def midi_pitch_to_contour_bin(pitch_midi: int) -> np.array:
     return 12.0 * CONTOURS_BINS_PER_SEMITONE * np.log2(pitch_hz / ANNOTATIONS_BASE_FREQUENCY)
 
 
-def get_pitch_bends(
-    contours: np.ndarray, note_events: List[Tuple[int, int, int, float]], n_bins_tolerance: int = 25
-) -> List[Tuple[int, int, int, float, Optional[List[int]]]]:
+def get_pitch_bends(contours: np.ndarray, note_events: NoteEvents, n_bins_tolerance: int = 25) -> NoteEvents:
     """Given note events and contours, estimate pitch bends per note.
     Pitch bends are represented as a sequence of evenly spaced midi pitch bend control units.
     The time stamps of each pitch bend can be inferred by computing an evenly spaced grid between
@@ -183,46 +183,56 @@ def get_pitch_bends(
 
     Args:
         contours: Matrix of estimated pitch contours
-        note_events: note event tuple
+        note_events: note events, with start and end in frames
         n_bins_tolerance: Pitch bend estimation range. Defaults to 25.
 
     Returns:
         note events with pitch bends
     """
+    if len(note_events) == 0:
+        return note_events
+
     window_length = n_bins_tolerance * 2 + 1
     freq_gaussian = scipy.signal.windows.gaussian(window_length, std=5)
-    note_events_with_pitch_bends = []
-    for start_idx, end_idx, pitch_midi, amplitude in note_events:
-        freq_idx = int(np.round(midi_pitch_to_contour_bin(pitch_midi)))
-        freq_start_idx = np.max([freq_idx - n_bins_tolerance, 0])
-        freq_end_idx = np.min([N_FREQ_BINS_CONTOURS, freq_idx + n_bins_tolerance + 1])
 
+    start_idx, end_idx, pitch_midi = note_events.start, note_events.end, note_events.pitch
+    freq_idx = np.round(midi_pitch_to_contour_bin(pitch_midi)).astype(int)
+
+    # pad with -inf so that bins outside the contour matrix never win the argmax
+    contours_padded = np.pad(
+        contours,
+        [[0, 0], [n_bins_tolerance, n_bins_tolerance]],
+        mode="constant",
+        constant_values=-np.inf,
+    )
+
+    # gather the window of bins around each note's pitch for every frame of every note
+    n_note_frames = end_idx - start_idx
+    note_offsets = np.concatenate([[0], np.cumsum(n_note_frames)])
+    bends = np.zeros((note_offsets[-1],), dtype=int)
+    window_idx = np.arange(window_length)
+    for chunk_start in range(0, note_offsets[-1], PITCH_BEND_CHUNK_FRAMES):
+        frame_idx = np.arange(chunk_start, min(chunk_start + PITCH_BEND_CHUNK_FRAMES, note_offsets[-1]))
+        note_idx = np.searchsorted(note_offsets, frame_idx, side="right") - 1
+        time_idx = start_idx[note_idx] + frame_idx - note_offsets[note_idx]
         pitch_bend_submatrix = (
-            contours[start_idx:end_idx, freq_start_idx:freq_end_idx]
-            * freq_gaussian[
-                np.max([0, n_bins_tolerance - freq_idx]) : window_length
-                - np.max([0, freq_idx - (N_FREQ_BINS_CONTOURS - n_bins_tolerance - 1)])
-            ]
+            contours_padded[time_idx[:, np.newaxis], freq_idx[note_idx, np.newaxis] + window_idx] * freq_gaussian
         )
-        pb_shift = n_bins_tolerance - np.max([0, n_bins_tolerance - freq_idx])
+        bends[frame_idx] = np.argmax(pitch_bend_submatrix, axis=1) - n_bins_tolerance  # in units of 1/3 semitones
 
-        bends: Optional[List[int]] = list(
-            np.argmax(pitch_bend_submatrix, axis=1) - pb_shift
-        )  # this is in units of 1/3 semitones
-        note_events_with_pitch_bends.append((start_idx, end_idx, pitch_midi, amplitude, bends))
-    return note_events_with_pitch_bends
+    return NoteEvents(start_idx, end_idx, pitch_midi, note_events.amplitude, bends, note_offsets)
 
 
 def note_events_to_midi(
-    note_events_with_pitch_bends: List[Tuple[float, float, int, float, Optional[List[int]]]],
+    note_events_with_pitch_bends: Union[NoteEvents, List[Tuple[float, float, int, float, Optional[List[int]]]]],
     multiple_pitch_bends: bool = False,
     midi_tempo: float = 120,
 ) -> pretty_midi.PrettyMIDI:
     """Create a pretty_midi object from note events
 
     Args:
-        note_events : list of tuples [(start_time_seconds, end_time_seconds, pitch_midi, amplitude)]
-            where amplitude is a number between 0 and 1
+        note_events : note events, or list of tuples [(start_time_seconds, end_time_seconds, pitch_midi, amplitude,
+            pitch_bends)] where amplitude is a number between 0 and 1
         multiple_pitch_bends : If True, allow overlapping notes to have pitch bends
             Note: this will assign each pitch to its own midi instrument, as midi does not yet
             support per-note pitch bends
@@ -231,51 +241,72 @@ def note_events_to_midi(
         pretty_midi.PrettyMIDI() object
 
     """
+    if not isinstance(note_events_with_pitch_bends, NoteEvents):
+        note_events_with_pitch_bends = NoteEvents.from_tuples(note_events_with_pitch_bends)
+
     mid = pretty_midi.PrettyMIDI(initial_tempo=midi_tempo)
     if not multiple_pitch_bends:
         note_events_with_pitch_bends = drop_overlapping_pitch_bends(note_events_with_pitch_bends)
 
+    # convert the pitch bends of all notes at once
+    pitch_bend_midi_ticks = np.round(
+        note_events_with_pitch_bends.pitch_bends * 4096 / CONTOURS_BINS_PER_SEMITONE
+    ).astype(int)
+    # This supports pitch bends up to 2 semitones
+    # If we estimate pitch bends above/below 2 semitones, crop them here when adding them to the midi file
+    pitch_bend_midi_ticks = np.clip(pitch_bend_midi_ticks, -N_PITCH_BEND_TICKS, N_PITCH_BEND_TICKS - 1)
+    pitch_bend_offsets = note_events_with_pitch_bends.pitch_bend_offsets
+
     piano_program = pretty_midi.instrument_name_to_program("Electric Piano 1")
     instruments: DefaultDict[int, pretty_midi.Instrument] = defaultdict(
         lambda: pretty_midi.Instrument(program=piano_program)
     )
-    for start_time, end_time, note_number, amplitude, pitch_bend in note_events_with_pitch_bends:
+    for i, (start_time, end_time, note_number, velocity) in enumerate(
+        zip(
+            note_events_with_pitch_bends.start.tolist(),
+            note_events_with_pitch_bends.end.tolist(),
+            note_events_with_pitch_bends.pitch.tolist(),
+            note_events_with_pitch_bends.velocities().tolist(),
+        )
+    ):
         instrument = instruments[note_number] if multiple_pitch_bends else instruments[0]
         note = pretty_midi.Note(
-            velocity=int(np.round(127 * amplitude)),
+            velocity=velocity,
             pitch=note_number,
             start=start_time,
             end=end_time,
         )
         instrument.notes.append(note)
-        if not pitch_bend:
+        n_pitch_bends = pitch_bend_offsets[i + 1] - pitch_bend_offsets[i]
+        if n_pitch_bends == 0:
             continue
-        pitch_bend_times = np.linspace(start_time, end_time, len(pitch_bend))
-        pitch_bend_midi_ticks = np.round(np.array(pitch_bend) * 4096 / CONTOURS_BINS_PER_SEMITONE).astype(int)
-        # This supports pitch bends up to 2 semitones
-        # If we estimate pitch bends above/below 2 semitones, crop them here when adding them to the midi file
-        pitch_bend_midi_ticks[pitch_bend_midi_ticks > N_PITCH_BEND_TICKS - 1] = N_PITCH_BEND_TICKS - 1
-        pitch_bend_midi_ticks[pitch_bend_midi_ticks < -N_PITCH_BEND_TICKS] = -N_PITCH_BEND_TICKS
-        for pb_time, pb_midi in zip(pitch_bend_times, pitch_bend_midi_ticks):
+        pitch_bend_times = np.linspace(start_time, end_time, n_pitch_bends)
+        for pb_time, pb_midi in zip(
+            pitch_bend_times, pitch_bend_midi_ticks[pitch_bend_offsets[i] : pitch_bend_offsets[i + 1]]
+        ):
             instrument.pitch_bends.append(pretty_midi.PitchBend(pb_midi, pb_time))
     mid.instruments.extend(instruments.values())
 
     return mid
 
 
-def drop_overlapping_pitch_bends(
-    note_events_with_pitch_bends: List[Tuple[float, float, int, float, Optional[List[int]]]]
-) -> List[Tuple[float, float, int, float, Optional[List[int]]]]:
-    """Drop pitch bends from any notes that overlap in time with another note"""
-    note_events = sorted(note_events_with_pitch_bends)
-    for i in range(len(note_events) - 1):
-        for j in range(i + 1, len(note_events)):
-            if note_events[j][0] >= note_events[i][1]:  # start j > end i
-                break
-            note_events[i] = note_events[i][:-1] + (None,)  # last field is pitch bend
-            note_events[j] = note_events[j][:-1] + (None,)
+def drop_overlapping_pitch_bends(note_events_with_pitch_bends: NoteEvents) -> NoteEvents:
+    """Drop pitch bends from any notes that overlap in time with another note. The notes are returned sorted."""
+    note_events = note_events_with_pitch_bends.sort()
+    if len(note_events) < 2:
+        return note_events
 
-    return note_events
+    start_times = note_events.start
+    end_times = note_events.end
+
+    # with notes sorted by start time, a note overlaps an earlier note if it starts before the
+    # latest end time seen so far, and overlaps a later note if the next note starts before it ends
+    max_previous_end = np.maximum.accumulate(end_times[:-1])
+    overlaps = np.zeros(len(note_events), dtype=bool)
+    overlaps[1:] |= start_times[1:] < max_previous_end
+    overlaps[:-1] |= start_times[1:] < end_times[:-1]
+
+    return note_events.drop_pitch_bends(overlaps)
 
 
 def get_infered_onsets(onsets: np.array, frames: np.array, n_diff: int = 2) -> np.array:
@@ -287,20 +318,26 @@ def get_infered_onsets(onsets: np.array, frames: np.array, n_diff: int = 2) -> n
         n_diff: Differences used to detect onsets.
 
     Returns:
-        The maximum between the predicted onsets and its differences.
+        The maximum between the predicted onsets and its differences. The inputs are not modified.
     """
-    diffs = []
-    for n in range(1, n_diff + 1):
-        frames_appended = np.concatenate([np.zeros((n, frames.shape[1])), frames])
-        diffs.append(frames_appended[n:, :] - frames_appended[:-n, :])
-    frame_diff = np.min(diffs, axis=0)
-    frame_diff[frame_diff < 0] = 0
-    frame_diff[:n_diff, :] = 0
-    frame_diff = np.max(onsets) * frame_diff / np.max(frame_diff)  # rescale to have the same max as onsets
-
-    max_onsets_diff = np.max([onsets, frame_diff], axis=0)  # use the max of the predicted onsets and the differences
-
-    return max_onsets_diff
+    # the smallest of the differences to the n_diff previous frames is the difference to their maximum,
+    # so all differences are computed in a single buffer from shifted views of the frames
+    frame_diff = np.zeros(frames.shape, dtype=np.result_type(onsets, frames, np.float32))
+    previous_max = frame_diff[n_diff:]
+    np.copyto(previous_max, frames[n_diff - 1 : -1])
+    for n in range(2, n_diff + 1):
+        np.maximum(previous_max, frames[n_diff - n : -n], out=previous_max)
+    np.subtract(frames[n_diff:], previous_max, out=previous_max)
+    np.maximum(frame_diff, 0, out=frame_diff)
+
+    max_frame_diff = np.max(frame_diff)
+    if max_frame_diff > 0:
+        # rescale to have the same max as onsets
+        frame_diff *= np.max(onsets)
+        frame_diff /= max_frame_diff
+
+    # use the max of the predicted onsets and the differences
+    return np.maximum(onsets, frame_diff, out=frame_diff)
 
 
 def constrain_frequency(
@@ -316,86 +353,109 @@ def constrain_frequency(
 
     Returns:
        The onset and frame activation matrices, with frequencies outside the min and max
-       frequency set to 0.
+       frequency set to 0. The inputs are returned as is if no frequency is constrained,
+       and are never modified.
     """
+    if max_freq is None and min_freq is None:
+        return onsets, frames
+
+    in_range = np.ones((frames.shape[1],), dtype=bool)
     if max_freq is not None:
         max_freq_idx = int(np.round(librosa.hz_to_midi(max_freq) - MIDI_OFFSET))
-        onsets[:, max_freq_idx:] = 0
-        frames[:, max_freq_idx:] = 0
+        in_range[max_freq_idx:] = False
     if min_freq is not None:
         min_freq_idx = int(np.round(librosa.hz_to_midi(min_freq) - MIDI_OFFSET))
-        onsets[:, :min_freq_idx] = 0
-        frames[:, :min_freq_idx] = 0
+        in_range[:min_freq_idx] = False
 
-    return onsets, frames
+    constrained_onsets = np.where(in_range, onsets, 0).astype(onsets.dtype, copy=False)
+    constrained_frames = np.where(in_range, frames, 0).astype(frames.dtype, copy=False)
 
+    return constrained_onsets, constrained_frames
 
-def model_frames_to_time(n_frames: int) -> np.ndarray:
-    original_times = librosa.core.frames_to_time(
-        np.arange(n_frames),
-        sr=AUDIO_SAMPLE_RATE,
-        hop_length=FFT_HOP,
-    )
-    window_numbers = np.floor(np.arange(n_frames) / ANNOT_N_FRAMES)
+
+def _compute_frame_times(n_frames: int) -> np.ndarray:
+    frame_idx = np.arange(n_frames)
+    original_times = (frame_idx * FFT_HOP) / AUDIO_SAMPLE_RATE  # as librosa.frames_to_time
+    window_numbers = np.floor(frame_idx / ANNOT_N_FRAMES)
     window_offset = (FFT_HOP / AUDIO_SAMPLE_RATE) * (
         ANNOT_N_FRAMES - (AUDIO_N_SAMPLES / FFT_HOP)
     ) + 0.0018  # this is a magic number, but it's needed for this to align properly
     times = original_times - (window_offset * window_numbers)
+    times.flags.writeable = False
     return times
 
 
-def output_to_notes_polyphonic(
-    frames: np.array,
-    onsets: np.array,
-    onset_thresh: float,
-    frame_thresh: float,
-    min_note_len: int,
-    infer_onsets: bool,
-    max_freq: Optional[float],
-    min_freq: Optional[float],
-    melodia_trick: bool = True,
-    energy_tol: int = 11,
-) -> List[Tuple[int, int, int, float]]:
-    """Decode raw model output to polyphonic note events
+# frame times shared by all calls, grown geometrically to the longest output seen
+_frame_times = _compute_frame_times(0)
+
+
+def model_frames_to_time(n_frames: int) -> np.ndarray:
+    """Get the time of each model output frame.
 
     Args:
-        frames: Frame activation matrix (n_times, n_freqs).
-        onsets: Onset activation matrix (n_times, n_freqs).
-        onset_thresh: Minimum amplitude of an onset activation to be considered an onset.
-        frame_thresh: Minimum amplitude of a frame activation for a note to remain "on".
-        min_note_len: Minimum allowed note length in frames.
-        infer_onsets: If True, add additional onsets when there are large differences in frame amplitudes.
-        max_freq: Maximum allowed output frequency, in Hz.
-        min_freq: Minimum allowed output frequency, in Hz.
-        melodia_trick : Whether to use the melodia trick to better detect notes.
-        energy_tol: Drop notes below this energy.
+        n_frames: Number of frames of the model output.
 
     Returns:
-        list of tuples [(start_time_frames, end_time_frames, pitch_midi, amplitude)]
-        representing the note events, where amplitude is a number between 0 and 1
+        A read-only array (n_frames,) with the time of each frame in seconds.
     """
+    global _frame_times
+    frame_times = _frame_times
+    if frame_times.shape[0] < n_frames:
+        frame_times = _compute_frame_times(max(n_frames, 2 * frame_times.shape[0]))
+        _frame_times = frame_times
+    return frame_times[:n_frames]
 
-    n_frames = frames.shape[0]
 
-    onsets, frames = constrain_frequency(onsets, frames, max_freq, min_freq)
-    # use onsets inferred from frames in addition to the predicted onsets
-    if infer_onsets:
-        onsets = get_infered_onsets(onsets, frames)
+def note_frames_to_time(note_events: NoteEvents, n_frames: int) -> NoteEvents:
+    """Convert the start and end frames of note events to times in seconds.
+
+    Args:
+        note_events: Note events with start and end in frames.
+        n_frames: Number of frames of the model output the notes were created from.
+
+    Returns:
+        The note events with start and end in seconds.
+    """
+    times_s = model_frames_to_time(n_frames)
+    return NoteEvents(
+        times_s[note_events.start],
+        times_s[note_events.end],
+        note_events.pitch,
+        note_events.amplitude,
+        note_events.pitch_bends,
+        note_events.pitch_bend_offsets,
+    )
 
-    peak_thresh_mat = np.zeros(onsets.shape)
-    peaks = scipy.signal.argrelmax(onsets, axis=0)
-    peak_thresh_mat[peaks] = onsets[peaks]
 
-    onset_idx = np.where(peak_thresh_mat >= onset_thresh)
-    onset_time_idx = onset_idx[0][::-1]  # sort to go backwards in time
-    onset_freq_idx = onset_idx[1][::-1]  # sort to go backwards in time
+@numba.njit(cache=True, nogil=True)
+def track_onsets(
+    remaining_energy: np.array,
+    onset_time_idx: np.array,
+    onset_freq_idx: np.array,
+    frame_thresh: float,
+    min_note_len: int,
+    energy_tol: int,
+) -> np.array:
+    """Track each onset forward in time until its frame energy drops, zeroing the energy used by each note.
 
-    remaining_energy = np.zeros(frames.shape)
-    remaining_energy[:, :] = frames[:, :]
+    Args:
+        remaining_energy: Frame activation matrix (n_times, n_freqs). Modified in place.
+        onset_time_idx: Time indices of the onsets, in the order they are processed.
+        onset_freq_idx: Frequency indices of the onsets.
+        frame_thresh: Minimum amplitude of a frame activation for a note to remain "on".
+        min_note_len: Minimum allowed note length in frames.
+        energy_tol: Number of consecutive frames below frame_thresh that end a note.
+
+    Returns:
+        array (n_notes, 3) of (start_time_frames, end_time_frames, freq_idx) per note
+    """
+    n_frames = remaining_energy.shape[0]
+    note_bounds = np.zeros((onset_time_idx.shape[0], 3), dtype=np.int64)
+    n_notes = 0
+    for j in range(onset_time_idx.shape[0]):
+        note_start_idx = onset_time_idx[j]
+        freq_idx = onset_freq_idx[j]
 
-    # loop over onsets
-    note_events = []
-    for note_start_idx, freq_idx in zip(onset_time_idx, onset_freq_idx):
         # if we're too close to the end of the audio, continue
         if note_start_idx >= n_frames - 1:
             continue
@@ -422,77 +482,302 @@ def output_to_notes_polyphonic(
         if freq_idx > 0:
             remaining_energy[note_start_idx:i, freq_idx - 1] = 0
 
-        # add the note
-        amplitude = np.mean(frames[note_start_idx:i, freq_idx])
-        note_events.append(
-            (
-                note_start_idx,
-                i,
-                freq_idx + MIDI_OFFSET,
-                amplitude,
-            )
+        note_bounds[n_notes, 0] = note_start_idx
+        note_bounds[n_notes, 1] = i
+        note_bounds[n_notes, 2] = freq_idx
+        n_notes += 1
+
+    return note_bounds[:n_notes]
+
+
+@numba.njit(cache=True, nogil=True)
+def track_melodia_peaks(
+    remaining_energy: np.array,
+    peak_idx: np.array,
+    frame_thresh: float,
+    min_note_len: int,
+    energy_tol: int,
+) -> np.array:
+    """Grow notes forwards and backwards in time from energy peaks (the melodia trick),
+    zeroing the energy used by each note.
+
+    Args:
+        remaining_energy: Frame activation matrix (n_times, n_freqs). Modified in place.
+        peak_idx: Flat indices into remaining_energy of all frames above frame_thresh,
+            sorted by descending energy.
+        frame_thresh: Minimum amplitude of a frame activation for a note to remain "on".
+        min_note_len: Minimum allowed note length in frames.
+        energy_tol: Number of consecutive frames below frame_thresh that end a note.
+
+    Returns:
+        array (n_notes, 3) of (start_time_frames, end_time_frames, freq_idx) per note
+    """
+    n_frames, n_freqs = remaining_energy.shape
+    note_bounds = np.zeros((peak_idx.shape[0], 3), dtype=np.int64)
+    n_notes = 0
+    for j in range(peak_idx.shape[0]):
+        i_mid = peak_idx[j] // n_freqs
+        freq_idx = peak_idx[j] % n_freqs
+        if remaining_energy[i_mid, freq_idx] <= frame_thresh:
+            # already used by another note
+            continue
+        remaining_energy[i_mid, freq_idx] = 0
+
+        # forward pass
+        i = i_mid + 1
+        k = 0
+        while i < n_frames - 1 and k < energy_tol:
+            if remaining_energy[i, freq_idx] < frame_thresh:
+                k += 1
+            else:
+                k = 0
+
+            remaining_energy[i, freq_idx] = 0
+            if freq_idx < MAX_FREQ_IDX:
+                remaining_energy[i, freq_idx + 1] = 0
+            if freq_idx > 0:
+                remaining_energy[i, freq_idx - 1] = 0
+
+            i += 1
+
+        i_end = i - 1 - k  # go back to frame above threshold
+
+        # backward pass
+        i = i_mid - 1
+        k = 0
+        while i > 0 and k < energy_tol:
+            if remaining_energy[i, freq_idx] < frame_thresh:
+                k += 1
+            else:
+                k = 0
+
+            remaining_energy[i, freq_idx] = 0
+            if freq_idx < MAX_FREQ_IDX:
+                remaining_energy[i, freq_idx + 1] = 0
+            if freq_idx > 0:
+                remaining_energy[i, freq_idx - 1] = 0
+
+            i -= 1
+
+        i_start = i + 1 + k  # go back to frame above threshold
+        assert i_start >= 0
+        assert i_end < n_frames
+
+        if i_end - i_start <= min_note_len:
+            # note is too short, skip it
+            continue
+
+        note_bounds[n_notes, 0] = i_start
+        note_bounds[n_notes, 1] = i_end
+        note_bounds[n_notes, 2] = freq_idx
+        n_notes += 1
+
+    return note_bounds[:n_notes]
+
+
+def get_onset_peaks(
+    frames: np.array,
+    onsets: np.array,
+    infer_onsets: bool,
+    max_freq: Optional[float],
+    min_freq: Optional[float],
+) -> Tuple[np.array, np.array, np.array, np.array]:
+    """Find the onset peaks that are candidate note starts. These do not depend on the thresholds
+    used to create notes, so they can be shared between calls to `notes_from_onset_peaks`.
+
+    Args:
+        frames: Frame activation matrix (n_times, n_freqs).
+        onsets: Onset activation matrix (n_times, n_freqs).
+        infer_onsets: If True, add additional onsets when there are large differences in frame amplitudes.
+        max_freq: Maximum allowed output frequency, in Hz.
+        min_freq: Minimum allowed output frequency, in Hz.
+
+    Returns:
+        frames: The frame activation matrix, with frequencies outside the min and max frequency set to 0.
+        onset_time_idx: Time indices of the onset peaks, sorted backwards in time.
+        onset_freq_idx: Frequency indices of the onset peaks.
+        onset_values: Onset activation of each peak.
+    """
+    onsets, frames = constrain_frequency(onsets, frames, max_freq, min_freq)
+    # use onsets inferred from frames in addition to the predicted onsets
+    if infer_onsets:
+        onsets = get_infered_onsets(onsets, frames)
+
+    peak_time_idx, peak_freq_idx = scipy.signal.argrelmax(onsets, axis=0)
+    # sort to go backwards in time
+    order = np.lexsort((-peak_freq_idx, -peak_time_idx))
+    onset_time_idx = peak_time_idx[order]
+    onset_freq_idx = peak_freq_idx[order]
+    onset_values = onsets[onset_time_idx, onset_freq_idx].astype(np.float64)
+
+    return frames, onset_time_idx, onset_freq_idx, onset_values
+
+
+def notes_from_onset_peaks(
+    frames: np.array,
+    onset_time_idx: np.array,
+    onset_freq_idx: np.array,
+    onset_values: np.array,
+    onset_thresh: float,
+    frame_thresh: float,
+    min_note_len: int,
+    melodia_trick: bool = True,
+    energy_tol: int = 11,
+) -> NoteEvents:
+    """Create note events from onset peaks found by `get_onset_peaks`.
+
+    Args:
+        frames: Frame activation matrix (n_times, n_freqs), as returned by `get_onset_peaks`.
+        onset_time_idx: Time indices of the onset peaks, sorted backwards in time.
+        onset_freq_idx: Frequency indices of the onset peaks.
+        onset_values: Onset activation of each peak.
+        onset_thresh: Minimum amplitude of an onset activation to be considered an onset.
+        frame_thresh: Minimum amplitude of a frame activation for a note to remain "on".
+        min_note_len: Minimum allowed note length in frames.
+        melodia_trick : Whether to use the melodia trick to better detect notes.
+        energy_tol: Drop notes below this energy.
+
+    Returns:
+        The note events, with start and end in frames and amplitude a number between 0 and 1
+    """
+    is_onset = onset_values >= onset_thresh
+
+    remaining_energy = frames.copy()
+
+    # loop over onsets
+    note_bounds = [
+        track_onsets(
+            remaining_energy, onset_time_idx[is_onset], onset_freq_idx[is_onset], frame_thresh, min_note_len, energy_tol
         )
+    ]
 
     if melodia_trick:
-        energy_shape = remaining_energy.shape
-
-        while np.max(remaining_energy) > frame_thresh:
-            i_mid, freq_idx = np.unravel_index(np.argmax(remaining_energy), energy_shape)
-            remaining_energy[i_mid, freq_idx] = 0
-
-            # forward pass
-            i = i_mid + 1
-            k = 0
-            while i < n_frames - 1 and k < energy_tol:
-                if remaining_energy[i, freq_idx] < frame_thresh:
-                    k += 1
-                else:
-                    k = 0
-
-                remaining_energy[i, freq_idx] = 0
-                if freq_idx < MAX_FREQ_IDX:
-                    remaining_energy[i, freq_idx + 1] = 0
-                if freq_idx > 0:
-                    remaining_energy[i, freq_idx - 1] = 0
-
-                i += 1
-
-            i_end = i - 1 - k  # go back to frame above threshold
-
-            # backward pass
-            i = i_mid - 1
-            k = 0
-            while i > 0 and k < energy_tol:
-                if remaining_energy[i, freq_idx] < frame_thresh:
-                    k += 1
-                else:
-                    k = 0
-
-                remaining_energy[i, freq_idx] = 0
-                if freq_idx < MAX_FREQ_IDX:
-                    remaining_energy[i, freq_idx + 1] = 0
-                if freq_idx > 0:
-                    remaining_energy[i, freq_idx - 1] = 0
-
-                i -= 1
-
-            i_start = i + 1 + k  # go back to frame above threshold
-            assert i_start >= 0, "{}".format(i_start)
-            assert i_end < n_frames
-
-            if i_end - i_start <= min_note_len:
-                # note is too short, skip it
-                continue
-
-            # add the note
-            amplitude = np.mean(frames[i_start:i_end, freq_idx])
-            note_events.append(
-                (
-                    i_start,
-                    i_end,
-                    freq_idx + MIDI_OFFSET,
-                    amplitude,
-                )
-            )
+        # energy is only ever zeroed, so visiting peaks in descending order of their initial
+        # energy and skipping zeroed ones gives the same sequence as repeatedly taking the argmax
+        flat_energy = remaining_energy.reshape(-1)
+        peak_idx = np.flatnonzero(flat_energy > frame_thresh)
+        peak_idx = peak_idx[np.argsort(-flat_energy[peak_idx], kind="stable")]
+
+        note_bounds.append(
+            track_melodia_peaks(remaining_energy, peak_idx, frame_thresh, min_note_len, energy_tol)
+        )
+
+    start_idx, end_idx, freq_idx = np.concatenate(note_bounds).T
+    amplitude = np.array(
+        [np.mean(frames[i_start:i_end, f]) for i_start, i_end, f in zip(start_idx, end_idx, freq_idx)],
+        dtype=frames.dtype,
+    )
+    note_events = NoteEvents(start_idx, end_idx, freq_idx + MIDI_OFFSET, amplitude)
 
     return note_events
+
+
+def output_to_notes_polyphonic(
+    frames: np.array,
+    onsets: np.array,
+    onset_thresh: float,
+    frame_thresh: float,
+    min_note_len: int,
+    infer_onsets: bool,
+    max_freq: Optional[float],
+    min_freq: Optional[float],
+    melodia_trick: bool = True,
+    energy_tol: int = 11,
+) -> NoteEvents:
+    """Decode raw model output to polyphonic note events
+
+    Args:
+        frames: Frame activation matrix (n_times, n_freqs).
+        onsets: Onset activation matrix (n_times, n_freqs).
+        onset_thresh: Minimum amplitude of an onset activation to be considered an onset.
+        frame_thresh: Minimum amplitude of a frame activation for a note to remain "on".
+        min_note_len: Minimum allowed note length in frames.
+        infer_onsets: If True, add additional onsets when there are large differences in frame amplitudes.
+        max_freq: Maximum allowed output frequency, in Hz.
+        min_freq: Minimum allowed output frequency, in Hz.
+        melodia_trick : Whether to use the melodia trick to better detect notes.
+        energy_tol: Drop notes below this energy.
+
+    Returns:
+        The note events, with start and end in frames and amplitude a number between 0 and 1
+    """
+    frames, onset_time_idx, onset_freq_idx, onset_values = get_onset_peaks(
+        frames, onsets, infer_onsets, max_freq, min_freq
+    )
+    return notes_from_onset_peaks(
+        frames,
+        onset_time_idx,
+        onset_freq_idx,
+        onset_values,
+        onset_thresh,
+        frame_thresh,
+        min_note_len,
+        melodia_trick,
+        energy_tol,
+    )
+
+
+def sweep_note_thresholds(
+    output: Dict[str, np.array],
+    onset_threshs: Iterable[float],
+    frame_threshs: Iterable[float],
+    min_note_lens: Iterable[int],
+    infer_onsets: bool = True,
+    min_freq: Optional[float] = None,
+    max_freq: Optional[float] = None,
+    include_pitch_bends: bool = False,
+    melodia_trick: bool = True,
+    n_workers: int = 0,
+) -> Dict[Tuple[float, float, int], NoteEvents]:
+    """Create note events from one model output for every combination of thresholds.
+
+    The onset peaks are found once and shared by all combinations, which are then evaluated
+    independently, optionally in parallel.
+
+    Args:
+        output: The model output, as passed to `model_output_to_notes`.
+        onset_threshs: Onset thresholds to try.
+        frame_threshs: Frame thresholds to try.
+        min_note_lens: Minimum note lengths to try, in frames.
+        infer_onsets: If True, add additional onsets when there are large differences in frame amplitudes.
+        min_freq: Minimum allowed output frequency, in Hz. If None, all frequencies are used.
+        max_freq: Maximum allowed output frequency, in Hz. If None, all frequencies are used.
+        include_pitch_bends: If True, include pitch bends.
+        melodia_trick: Use the melodia post-processing step.
+        n_workers: Number of threads evaluating combinations in parallel. If 0, they are evaluated in
+            the calling thread.
+
+    Returns:
+        A dictionary mapping each (onset_thresh, frame_thresh, min_note_len) combination to its
+        note events, in the format returned by `model_output_to_notes`.
+    """
+    contours = output["contour"]
+    frames, onset_time_idx, onset_freq_idx, onset_values = get_onset_peaks(
+        output["note"], output["onset"], infer_onsets, max_freq, min_freq
+    )
+
+    def create_notes(params: Tuple[float, float, int]) -> NoteEvents:
+        onset_thresh, frame_thresh, min_note_len = params
+        estimated_notes = notes_from_onset_peaks(
+            frames,
+            onset_time_idx,
+            onset_freq_idx,
+            onset_values,
+            onset_thresh,
+            frame_thresh,
+            min_note_len,
+            melodia_trick,
+        )
+        if include_pitch_bends:
+            estimated_notes_with_pitch_bend = get_pitch_bends(contours, estimated_notes)
+        else:
+            estimated_notes_with_pitch_bend = estimated_notes
+        return note_frames_to_time(estimated_notes_with_pitch_bend, contours.shape[0])
+
+    grid = list(itertools.product(onset_threshs, frame_threshs, min_note_lens))
+    if n_workers <= 0:
+        return {params: create_notes(params) for params in grid}
+
+    # the note tracking kernels release the GIL, so threads can share the onset peaks without copies
+    with concurrent.futures.ThreadPoolExecutor(max_workers=n_workers) as pool:
+        return dict(zip(grid, pool.map(create_notes, grid)))
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright 2022 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+
+class NoteEvents:
+    """Note events stored column by column.
+
+    Each note has a start, an end, a midi pitch and an amplitude between 0 and 1. Start and end
+    are frame indices or times in seconds, depending on the stage of note creation. The pitch
+    bends of all notes are stored in one flat buffer: the bends of note i are
+    `pitch_bends[pitch_bend_offsets[i] : pitch_bend_offsets[i + 1]]`, and a note without
+    pitch bends has an empty range.
+
+    Iterating yields (start, end, pitch_midi, amplitude, pitch_bends) tuples, where pitch_bends
+    is a list or None, so note events can still be used as a list of tuples.
+    """
+
+    def __init__(
+        self,
+        start: np.ndarray,
+        end: np.ndarray,
+        pitch: np.ndarray,
+        amplitude: np.ndarray,
+        pitch_bends: Optional[np.ndarray] = None,
+        pitch_bend_offsets: Optional[np.ndarray] = None,
+    ):
+        """
+        Args:
+            start: Start of each note, in frames or seconds.
+            end: End of each note, in frames or seconds.
+            pitch: Midi pitch of each note.
+            amplitude: Amplitude of each note, between 0 and 1.
+            pitch_bends: Flat buffer of the pitch bends of all notes. If None, no note has pitch bends.
+            pitch_bend_offsets: array (n_notes + 1,) of the start of each note's pitch bends in pitch_bends.
+        """
+        self.start = np.asarray(start)
+        self.end = np.asarray(end)
+        self.pitch = np.asarray(pitch)
+        self.amplitude = np.asarray(amplitude)
+        if pitch_bends is None or pitch_bend_offsets is None:
+            pitch_bends = np.zeros((0,), dtype=int)
+            pitch_bend_offsets = np.zeros((len(self.start) + 1,), dtype=int)
+        self.pitch_bends = np.asarray(pitch_bends)
+        self.pitch_bend_offsets = np.asarray(pitch_bend_offsets)
+        n_notes = len(self.start)
+        assert (
+            len(self.end) == n_notes
+            and len(self.pitch) == n_notes
+            and len(self.amplitude) == n_notes
+            and len(self.pitch_bend_offsets) == n_notes + 1
+        ), "All note event columns must have the same length"
+
+    @classmethod
+    def from_tuples(cls, note_events: Iterable[Tuple[Any, ...]]) -> "NoteEvents":
+        """Create note events from (start, end, pitch_midi, amplitude[, pitch_bends]) tuples.
+
+        Args:
+            note_events: The note event tuples. Pitch bends are None or a list of ints.
+
+        Returns:
+            The note events.
+        """
+        note_events = list(note_events)
+        pitch_bends = [list(note[4]) if len(note) > 4 and note[4] is not None else [] for note in note_events]
+        return cls(
+            np.array([note[0] for note in note_events]),
+            np.array([note[1] for note in note_events]),
+            np.array([note[2] for note in note_events], dtype=int),
+            np.array([note[3] for note in note_events]),
+            np.array([bend for bends in pitch_bends for bend in bends], dtype=int),
+            np.concatenate([[0], np.cumsum([len(bends) for bends in pitch_bends], dtype=int)]),
+        )
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    def __iter__(self) -> Iterator[Tuple[Any, Any, Any, Any, Optional[List[int]]]]:
+        for i, (start, end, pitch, amplitude) in enumerate(zip(self.start, self.end, self.pitch, self.amplitude)):
+            yield start, end, pitch, amplitude, self.pitch_bend(i)
+
+    def __getitem__(
+        self, index: Union[int, slice, Sequence[int], np.ndarray]
+    ) -> Union[Tuple[Any, Any, Any, Any, Optional[List[int]]], "NoteEvents"]:
+        """Get a single note event tuple for an integer index, or the selected note events otherwise."""
+        if isinstance(index, (int, np.integer)):
+            return self.start[index], self.end[index], self.pitch[index], self.amplitude[index], self.pitch_bend(index)
+        return self.select(index)
+
+    def __repr__(self) -> str:
+        return f"NoteEvents(n_notes={len(self)})"
+
+    @property
+    def n_pitch_bends(self) -> np.ndarray:
+        """Number of pitch bends of each note."""
+        return np.diff(self.pitch_bend_offsets)
+
+    def pitch_bend(self, i: int) -> Optional[List[int]]:
+        """Get the pitch bends of a single note, or None if it has none."""
+        if i < 0:
+            i += len(self)
+        bends = self.pitch_bends[self.pitch_bend_offsets[i] : self.pitch_bend_offsets[i + 1]]
+        return list(bends) if len(bends) else None
+
+    def select(self, index: Union[slice, Sequence[int], np.ndarray]) -> "NoteEvents":
+        """Select a subset of the note events, keeping their pitch bends.
+
+        Args:
+            index: A slice, boolean mask or integer indices of the notes to keep, in the order to keep them in.
+
+        Returns:
+            The selected note events.
+        """
+        note_idx = np.arange(len(self))[index]
+        n_pitch_bends = self.n_pitch_bends[note_idx]
+        pitch_bend_offsets = np.concatenate([[0], np.cumsum(n_pitch_bends)]).astype(int)
+        # index of each kept pitch bend in the flat buffer
+        pitch_bend_idx = (
+            np.arange(pitch_bend_offsets[-1])
+            - np.repeat(pitch_bend_offsets[:-1], n_pitch_bends)
+            + np.repeat(self.pitch_bend_offsets[:-1][note_idx], n_pitch_bends)
+        )
+        return NoteEvents(
+            self.start[note_idx],
+            self.end[note_idx],
+            self.pitch[note_idx],
+            self.amplitude[note_idx],
+            self.pitch_bends[pitch_bend_idx],
+            pitch_bend_offsets,
+        )
+
+    def sort(self) -> "NoteEvents":
+        """Sort the note events by start, then end, pitch and amplitude.
+
+        Returns:
+            The sorted note events.
+        """
+        return self.select(np.lexsort((self.amplitude, self.pitch, self.end, self.start)))
+
+    def drop_pitch_bends(self, mask: Optional[np.ndarray] = None) -> "NoteEvents":
+        """Remove the pitch bends of some or all notes.
+
+        Args:
+            mask: boolean array (n_notes,) of the notes to remove pitch bends from.
+                If None, they are removed from all notes.
+
+        Returns:
+            The note events without the masked pitch bends.
+        """
+        if mask is None:
+            return NoteEvents(self.start, self.end, self.pitch, self.amplitude)
+        n_pitch_bends = np.where(mask, 0, self.n_pitch_bends)
+        return NoteEvents(
+            self.start,
+            self.end,
+            self.pitch,
+            self.amplitude,
+            self.pitch_bends[np.repeat(~mask, self.n_pitch_bends)],
+            np.concatenate([[0], np.cumsum(n_pitch_bends)]).astype(int),
+        )
+
+    def velocities(self) -> np.ndarray:
+        """Midi velocity of each note, from its amplitude."""
+        return np.round(127 * self.amplitude).astype(int)
@@ -25,7 +25,9 @@ from basic_pitch import (
     FilenameSuffix,
     build_icassp_2022_model_path,
 )
-from basic_pitch.inference import Model
+from basic_pitch.cache import ModelOutputCache
+from basic_pitch.constants import DEFAULT_RESAMPLE_QUALITY, RESAMPLE_QUALITIES
+from basic_pitch.inference import DEFAULT_BATCH_SIZE, MODEL_OUTPUT_PRECISIONS, MODEL_TYPES_BY_SUFFIX, Model
 
 
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
@@ -55,6 +57,19 @@ def main() -> None:
         choices=["tf", "coreml", "tflite", "onnx"],
         help="If used, --model-path is ignored and instead the model serialization type" "specified is used.",
     )
+    parser.add_argument(
+        "--num-threads",
+        type=int,
+        default=None,
+        help="The number of threads the model may use per operation. Defaults to the backend's default.",
+    )
+    parser.add_argument(
+        "--inter-op-threads",
+        type=int,
+        default=None,
+        help="The number of threads the model may use to run independent operations in parallel "
+        "(ONNX and TensorFlow only). Defaults to the backend's default.",
+    )
     parser.add_argument(
         "--save-midi",
         action="store_true",
@@ -71,6 +86,13 @@ def main() -> None:
         action="store_true",
         help="Save the raw model output as an npz file.",
     )
+    parser.add_argument(
+        "--model-output-precision",
+        type=str,
+        choices=MODEL_OUTPUT_PRECISIONS,
+        default="float32",
+        help="The precision the raw model output is saved with. float16 and uint8 outputs are compressed.",
+    )
     parser.add_argument(
         "--save-note-events",
         action="store_true",
@@ -124,6 +146,46 @@ def main() -> None:
         default=120,
         help="The tempo for the midi file.",
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="The number of audio windows passed to the model in a single call.",
+    )
+    parser.add_argument(
+        "--audio-workers",
+        type=int,
+        default=0,
+        help="The number of processes decoding audio files ahead of inference. "
+        "If 0, audio is decoded in the main process.",
+    )
+    parser.add_argument(
+        "--output-workers",
+        type=int,
+        default=0,
+        help="The number of threads creating notes and writing output files while the next file is "
+        "transcribed. If 0, outputs are written before the next file is transcribed.",
+    )
+    parser.add_argument(
+        "--resample-quality",
+        type=str,
+        choices=RESAMPLE_QUALITIES,
+        default=DEFAULT_RESAMPLE_QUALITY,
+        help="The quality of the resampler used for audio not sampled at 22050 Hz, from best to fastest.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="Optional directory to cache model outputs in. Audio files whose model output is cached "
+        "are not run through the model again, e.g. when only the thresholds change.",
+    )
+    parser.add_argument(
+        "--cache-max-size",
+        type=float,
+        default=2048,
+        help="The maximum size of the model output cache, in megabytes.",
+    )
     parser.add_argument(
         "--debug-file",
         default=None,
@@ -160,9 +222,15 @@ def main() -> None:
         verify_input_path(audio_path)
 
     if args.model_serialization:
-        model = Model(build_icassp_2022_model_path(FilenameSuffix[args.model_serialization]))
+        suffix = FilenameSuffix[args.model_serialization]
+        model = Model(
+            build_icassp_2022_model_path(suffix),
+            MODEL_TYPES_BY_SUFFIX[suffix],
+            num_threads=args.num_threads,
+            inter_op_num_threads=args.inter_op_threads,
+        )
     else:
-        model = Model(args.model_path)
+        model = Model(args.model_path, num_threads=args.num_threads, inter_op_num_threads=args.inter_op_threads)
 
     try:
         predict_and_save(
@@ -183,6 +251,12 @@ def main() -> None:
             pathlib.Path(args.debug_file) if args.debug_file else None,
             args.sonification_samplerate,
             args.midi_tempo,
+            args.batch_size,
+            args.audio_workers,
+            args.output_workers,
+            ModelOutputCache(args.cache_dir, int(args.cache_max_size * 1024**2)) if args.cache_dir else None,
+            args.resample_quality,
+            args.model_output_precision,
         )
         print("\n✨ Done ✨\n")
     except IOError as ioe:
@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright 2022 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pathlib
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+import numpy as np
+import numpy.typing as npt
+from numpy.lib.stride_tricks import sliding_window_view
+import pretty_midi
+import soxr
+
+from basic_pitch import ICASSP_2022_MODEL_PATH
+from basic_pitch.constants import (
+    AUDIO_SAMPLE_RATE,
+    AUDIO_N_SAMPLES,
+    ANNOTATIONS_FPS,
+    DEFAULT_RESAMPLE_QUALITY,
+    FFT_HOP,
+)
+from basic_pitch.inference import Model
+import basic_pitch.note_creation as infer
+
+# frames the note decoder waits for after the newest activation before it commits a note
+DEFAULT_LOOKAHEAD_FRAMES = 24
+# frames of already committed activations given to the note decoder as left context
+CONTEXT_FRAMES = 16
+
+
+class StreamingTranscriber:
+    """Transcribe audio that arrives in successive chunks, e.g. from a microphone.
+
+    Audio is windowed exactly like `basic_pitch.inference.run_inference`, and the model is run as
+    soon as a complete window is buffered. Note events are decoded over the most recent activations
+    and committed once they end at least `lookahead_frames` before the newest frame, so decoding
+    near chunk boundaries can differ slightly from offline transcription of the whole file.
+
+    The model needs a full AUDIO_N_SAMPLES window, so a new block of activations becomes available
+    every AUDIO_N_SAMPLES - n_overlapping_frames * FFT_HOP samples. Increasing n_overlapping_frames
+    lowers this latency at the cost of running the model more often.
+
+    Example:
+        transcriber = StreamingTranscriber(model, sample_rate=44100)
+        for chunk in chunks:
+            new_notes = transcriber.push(chunk)
+        new_notes = transcriber.flush()
+        midi_data = transcriber.to_midi()
+    """
+
+    def __init__(
+        self,
+        model_or_model_path: Union[Model, pathlib.Path, str] = ICASSP_2022_MODEL_PATH,
+        sample_rate: int = AUDIO_SAMPLE_RATE,
+        onset_threshold: float = 0.5,
+        frame_threshold: float = 0.3,
+        minimum_note_length: float = 127.70,
+        minimum_frequency: Optional[float] = None,
+        maximum_frequency: Optional[float] = None,
+        include_pitch_bends: bool = True,
+        melodia_trick: bool = True,
+        lookahead_frames: int = DEFAULT_LOOKAHEAD_FRAMES,
+        n_overlapping_frames: int = 30,
+        resample_quality: str = DEFAULT_RESAMPLE_QUALITY,
+    ):
+        """
+        Args:
+            model_or_model_path: A loaded Model or path to a serialized model to load.
+            sample_rate: Sample rate of the pushed audio chunks. Audio is resampled to AUDIO_SAMPLE_RATE.
+            onset_threshold: Minimum energy required for an onset to be considered present.
+            frame_threshold: Minimum energy requirement for a frame to be considered present.
+            minimum_note_length: The minimum allowed note length in milliseconds.
+            minimum_frequency: Minimum allowed output frequency, in Hz. If None, all frequencies are used.
+            maximum_frequency: Maximum allowed output frequency, in Hz. If None, all frequencies are used.
+            include_pitch_bends: If True, include pitch bends.
+            melodia_trick: Use the melodia post-processing step.
+            lookahead_frames: Number of frames a note must have ended before the newest frame to be emitted.
+            n_overlapping_frames: Number of frames consecutive model windows overlap by.
+            resample_quality: soxr quality preset used when sample_rate is not AUDIO_SAMPLE_RATE.
+        """
+        assert n_overlapping_frames % 2 == 0, "n_overlapping_frames must be even, got {}".format(
+            n_overlapping_frames
+        )
+        overlap_len = n_overlapping_frames * FFT_HOP
+        assert overlap_len < AUDIO_N_SAMPLES, "n_overlapping_frames is too large, got {}".format(n_overlapping_frames)
+
+        if isinstance(model_or_model_path, Model):
+            self.model = model_or_model_path
+        else:
+            self.model = Model(model_or_model_path)
+
+        self.onset_threshold = onset_threshold
+        self.frame_threshold = frame_threshold
+        self.min_note_len = int(np.round(minimum_note_length / 1000 * (AUDIO_SAMPLE_RATE / FFT_HOP)))
+        self.minimum_frequency = minimum_frequency
+        self.maximum_frequency = maximum_frequency
+        self.include_pitch_bends = include_pitch_bends
+        self.melodia_trick = melodia_trick
+        self.lookahead_frames = lookahead_frames
+
+        self._n_olap = n_overlapping_frames // 2
+        self._pad_len = overlap_len // 2
+        self._hop_size = AUDIO_N_SAMPLES - overlap_len
+        self._resampler = (
+            soxr.ResampleStream(sample_rate, AUDIO_SAMPLE_RATE, 1, dtype="float32", quality=resample_quality)
+            if sample_rate != AUDIO_SAMPLE_RATE
+            else None
+        )
+
+        # padded audio not yet consumed by the model, starting at the next window
+        self._audio = np.zeros((self._pad_len,), dtype=np.float32)
+        self._n_samples = 0
+        self._n_windows = 0
+
+        # activations and frame times (in seconds) starting at absolute frame self._frame_offset
+        self._activations: Dict[str, npt.NDArray[np.float32]] = {}
+        self._times = np.zeros((0,))
+        self._frame_offset = 0
+        self._decoded_until = 0
+        self._emitted: Set[Tuple[int, int]] = set()
+
+        self.note_events: List[Tuple[float, float, int, float, Optional[List[int]]]] = []
+        self.finished = False
+
+    def push(self, chunk: npt.NDArray[np.float32]) -> List[Tuple[float, float, int, float, Optional[List[int]]]]:
+        """Add a chunk of audio and return the note events committed because of it.
+
+        Args:
+            chunk: Audio samples with shape (n_samples,) or (n_samples, n_channels).
+
+        Returns:
+            A list of new note event tuples (start_time_s, end_time_s, pitch_midi, amplitude, pitch_bends).
+        """
+        assert not self.finished, "Cannot push audio after flush()"
+
+        audio = np.asarray(chunk, dtype=np.float32)
+        if audio.ndim > 1:
+            audio = np.mean(audio, axis=1)
+        if self._resampler is not None:
+            audio = self._resampler.resample_chunk(audio)
+
+        self._append_audio(audio)
+        self._run_model(final=False)
+        return self._decode(final=False)
+
+    def flush(self) -> List[Tuple[float, float, int, float, Optional[List[int]]]]:
+        """Process any buffered audio and return the remaining note events.
+
+        Returns:
+            A list of new note event tuples (start_time_s, end_time_s, pitch_midi, amplitude, pitch_bends).
+        """
+        if self.finished:
+            return []
+
+        if self._resampler is not None:
+            self._append_audio(self._resampler.resample_chunk(np.zeros((0,), dtype=np.float32), last=True))
+
+        self._run_model(final=True)
+        self.finished = True
+        return self._decode(final=True)
+
+    def to_midi(self, multiple_pitch_bends: bool = False, midi_tempo: float = 120) -> pretty_midi.PrettyMIDI:
+        """Create a pretty_midi object from all note events emitted so far.
+
+        Args:
+            multiple_pitch_bends: If True, allow overlapping notes in midi file to have pitch bends.
+            midi_tempo: The tempo for the midi file.
+
+        Returns:
+            pretty_midi.PrettyMIDI() object
+        """
+        return infer.note_events_to_midi(self.note_events, multiple_pitch_bends, midi_tempo)
+
+    def _append_audio(self, audio: npt.NDArray[np.float32]) -> None:
+        self._audio = np.concatenate([self._audio, audio])
+        self._n_samples += audio.shape[0]
+
+    def _run_model(self, final: bool) -> None:
+        """Run the model on every complete window in the audio buffer.
+
+        Args:
+            final: If True, zero pad the buffer so that all remaining audio is covered by a window.
+        """
+        if final:
+            # mirror window_padded_audio: windows start every hop_size samples of the padded signal
+            n_total_windows = int(np.ceil((self._pad_len + self._n_samples) / self._hop_size))
+            n_windows = n_total_windows - self._n_windows
+            if n_windows <= 0:
+                return
+            n_needed = (n_windows - 1) * self._hop_size + AUDIO_N_SAMPLES
+            if self._audio.shape[0] < n_needed:
+                self._audio = np.pad(self._audio, [[0, n_needed - self._audio.shape[0]]])
+        else:
+            if self._audio.shape[0] < AUDIO_N_SAMPLES:
+                return
+            n_windows = (self._audio.shape[0] - AUDIO_N_SAMPLES) // self._hop_size + 1
+
+        audio_windowed = sliding_window_view(self._audio, AUDIO_N_SAMPLES)[::self._hop_size, :, np.newaxis]
+        output = self.model.predict(np.ascontiguousarray(audio_windowed[:n_windows]))
+
+        n_frames = None
+        for k, v in output.items():
+            if self._n_olap > 0:
+                v = v[:, self._n_olap : -self._n_olap, :]
+            n_frames = v.shape[1]
+            v = v.reshape(v.shape[0] * v.shape[1], v.shape[2])
+            self._activations[k] = np.concatenate([self._activations[k], v]) if k in self._activations else v
+
+        # the first kept frame of a window is centred n_olap frames after the window start, which in
+        # the unpadded signal lines up with the window start itself
+        window_starts = (np.arange(self._n_windows, self._n_windows + n_windows) * self._hop_size).astype(float)
+        frame_starts = window_starts[:, np.newaxis] + FFT_HOP * np.arange(n_frames)[np.newaxis, :]
+        self._times = np.concatenate([self._times, frame_starts.reshape(-1) / AUDIO_SAMPLE_RATE])
+
+        self._n_windows += n_windows
+        self._audio = self._audio[n_windows * self._hop_size :]
+
+        if final:
+            # trim to original audio length
+            n_output_frames_original = int(np.floor(self._n_samples * (ANNOTATIONS_FPS / AUDIO_SAMPLE_RATE)))
+            n_keep = max(0, n_output_frames_original - self._frame_offset)
+            self._activations = {k: v[:n_keep] for k, v in self._activations.items()}
+            self._times = self._times[:n_keep]
+
+    def _decode(self, final: bool) -> List[Tuple[float, float, int, float, Optional[List[int]]]]:
+        """Decode note events from the buffered activations.
+
+        Args:
+            final: If True, commit every decoded note regardless of the lookahead.
+
+        Returns:
+            The newly committed note events.
+        """
+        if not self._activations:
+            return []
+
+        n_frames_total = self._frame_offset + self._times.shape[0]
+        horizon = n_frames_total if final else n_frames_total - self.lookahead_frames
+        if horizon <= self._decoded_until:
+            return []
+
+        region_start = max(self._frame_offset, self._decoded_until - CONTEXT_FRAMES)
+        local_start = region_start - self._frame_offset
+        frames = self._activations["note"][local_start:].copy()
+        onsets = self._activations["onset"][local_start:].copy()
+        contours = self._activations["contour"][local_start:]
+        if frames.shape[0] < 2:
+            return []
+
+        estimated_notes = infer.output_to_notes_polyphonic(
+            frames,
+            onsets,
+            onset_thresh=self.onset_threshold,
+            frame_thresh=self.frame_threshold,
+            min_note_len=self.min_note_len,
+            infer_onsets=True,
+            max_freq=self.maximum_frequency,
+            min_freq=self.minimum_frequency,
+            melodia_trick=self.melodia_trick,
+        )
+        if self.include_pitch_bends:
+            estimated_notes_with_pitch_bend = infer.get_pitch_bends(contours, estimated_notes)
+        else:
+            estimated_notes_with_pitch_bend = estimated_notes
+
+        new_note_events = []
+        pending_start = horizon
+        for start_idx, end_idx, pitch_midi, amplitude, pitch_bends in estimated_notes_with_pitch_bend:
+            start_idx += region_start
+            end_idx += region_start
+            if start_idx < self._decoded_until or (start_idx, pitch_midi) in self._emitted:
+                continue
+            if end_idx > horizon:
+                pending_start = min(pending_start, start_idx)
+                continue
+            self._emitted.add((start_idx, pitch_midi))
+            new_note_events.append(
+                (
+                    self._times[start_idx - self._frame_offset],
+                    self._times[end_idx - self._frame_offset],
+                    pitch_midi,
+                    amplitude,
+                    pitch_bends,
+                )
+            )
+
+        self._decoded_until = pending_start
+        self._emitted = {key for key in self._emitted if key[0] >= self._decoded_until}
+
+        # drop activations that can no longer be part of the decoding region
+        n_drop = max(0, self._decoded_until - CONTEXT_FRAMES - self._frame_offset)
+        if n_drop > 0:
+            self._activations = {k: v[n_drop:] for k, v in self._activations.items()}
+            self._times = self._times[n_drop:]
+            self._frame_offset += n_drop
+
+        new_note_events.sort()
+        self.note_events.extend(new_note_events)
+        return new_note_events
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright 2022 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import os
+import pathlib
+from typing import Dict
+
+import numpy as np
+import numpy.typing as npt
+import pytest
+
+from basic_pitch import ICASSP_2022_MODEL_PATH
+from basic_pitch.cache import ModelOutputCache
+
+OUTPUT_SIZES = {"note": 88, "onset": 88, "contour": 264}
+
+
+def random_model_output(seed: int, n_frames: int = 200) -> Dict[str, npt.NDArray[np.float32]]:
+    rng = np.random.default_rng(seed)
+    return {k: rng.random((n_frames, n_freqs), dtype=np.float32) for k, n_freqs in OUTPUT_SIZES.items()}
+
+
+def test_cache_put_get(tmp_path: pathlib.Path) -> None:
+    cache = ModelOutputCache(tmp_path / "cache")
+    model_output = random_model_output(0)
+
+    assert cache.get("missing") is None
+    cache.put("key", model_output)
+
+    cached = cache.get("key")
+    assert cached is not None and cached.keys() == model_output.keys()
+    for k, v in model_output.items():
+        assert cached[k].dtype == np.float32
+        np.testing.assert_array_equal(cached[k], v)
+
+
+def truncate(path: pathlib.Path) -> None:
+    data = path.read_bytes()
+    path.write_bytes(data[: len(data) // 2])
+
+
+def corrupt_header(path: pathlib.Path) -> None:
+    # overwrite the start of the first member, keeping the zip directory intact
+    data = bytearray(path.read_bytes())
+    data[200:1200] = bytes(1000)
+    path.write_bytes(bytes(data))
+
+
+def corrupt_member_data(path: pathlib.Path) -> None:
+    data = bytearray(path.read_bytes())
+    middle = len(data) // 2
+    data[middle : middle + 64] = bytes(64)
+    path.write_bytes(bytes(data))
+
+
+def empty(path: pathlib.Path) -> None:
+    path.write_bytes(b"")
+
+
+def garbage(path: pathlib.Path) -> None:
+    path.write_bytes(b"not a cached model output")
+
+
+@pytest.mark.parametrize("corrupt", [truncate, corrupt_header, corrupt_member_data, empty, garbage])
+def test_cache_corrupt_entry_is_a_miss(tmp_path: pathlib.Path, corrupt) -> None:
+    cache = ModelOutputCache(tmp_path)
+    model_output = random_model_output(1)
+    cache.put("key", model_output)
+    corrupt(tmp_path / "key.npz")
+
+    assert cache.get("key") is None
+    assert not (tmp_path / "key.npz").exists()
+
+    cache.put("key", model_output)
+    assert cache.get("key") is not None
+
+
+def test_cache_evicts_least_recently_used(tmp_path: pathlib.Path) -> None:
+    cache = ModelOutputCache(tmp_path)
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.put(key, random_model_output(i))
+        os.utime(tmp_path / f"{key}.npz", (1000 + i, 1000 + i))
+    entry_size = max((tmp_path / f"{key}.npz").stat().st_size for key in ["a", "b", "c"])
+
+    # reading an entry marks it as recently used, so "b" is now the oldest
+    assert cache.get("a") is not None
+    cache.max_size_bytes = 2 * entry_size
+    cache.evict()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.npz", "c.npz"]
+
+    # a put that overflows the cache evicts right away
+    cache.put("d", random_model_output(3))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.npz", "d.npz"]
+    assert cache.get("c") is None
+
+
+def test_cache_key_stability(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    cache = ModelOutputCache(tmp_path / "cache")
+    content = np.random.default_rng(4).bytes(3 * 1024**2 + 17)
+    (tmp_path / "a.wav").write_bytes(content)
+    (tmp_path / "b.wav").write_bytes(content)
+    (tmp_path / "c.wav").write_bytes(content[:-1] + b"\x00")
+    model_path = pathlib.Path(ICASSP_2022_MODEL_PATH)
+    key = cache.key(tmp_path / "a.wav", model_path)
+
+    # the key depends on the content of the audio, not its path or how it is passed
+    assert cache.key(str(tmp_path / "a.wav"), str(model_path)) == key
+    assert cache.key(tmp_path / "b.wav", model_path) == key
+    assert cache.key(tmp_path / "c.wav", model_path) != key
+    assert ModelOutputCache(tmp_path / "other").key(tmp_path / "a.wav", model_path) == key
+
+    fhandle = io.BytesIO(b"header" + content)
+    fhandle.seek(len(b"header"))
+    assert cache.key(fhandle, model_path) == key
+    assert fhandle.tell() == len(b"header")
+
+    # relative and absolute model paths resolve to the same model
+    monkeypatch.chdir(model_path.parent)
+    assert cache.key(tmp_path / "a.wav", model_path.name) == key
+
+    assert cache.key(tmp_path / "a.wav", model_path, resample_quality="VHQ") != key
+
+    audio = np.random.default_rng(5).random(1000, dtype=np.float32)
+    assert cache.key(audio, model_path) == cache.key(audio.copy(), model_path)
+    assert cache.key(audio[::2], model_path) == cache.key(np.ascontiguousarray(audio[::2]), model_path)
+    assert cache.key(audio[:-1], model_path) != cache.key(audio, model_path)
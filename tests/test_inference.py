@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright 2022 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pathlib
+from typing import Dict
+
+import numpy as np
+import numpy.typing as npt
+import pytest
+import soundfile
+
+from basic_pitch import ICASSP_2022_MODEL_PATH
+from basic_pitch.constants import ANNOT_N_FRAMES, AUDIO_N_SAMPLES, AUDIO_SAMPLE_RATE, FFT_HOP
+from basic_pitch.inference import (
+    MODEL_OUTPUT_NPZ_KEY,
+    Model,
+    OutputStitcher,
+    decode_and_save,
+    get_audio_input,
+    load_model_output,
+    run_inference,
+    save_model_output,
+    unwrap_output,
+    window_audio_file,
+    window_padded_audio,
+)
+
+N_OVERLAPPING_FRAMES = 30
+OVERLAP_LEN = N_OVERLAPPING_FRAMES * FFT_HOP
+HOP_SIZE = AUDIO_N_SAMPLES - OVERLAP_LEN
+OUTPUT_SIZES = {"note": 88, "onset": 88, "contour": 264}
+
+
+class WindowModel(Model):
+    """Stand-in for the network: each output frame is read from its own window of audio,
+    so frames stitched at the wrong position or dropped change the result."""
+
+    def __init__(self) -> None:
+        self.model_path = "window-model"
+
+    def predict(self, x: npt.NDArray[np.float32]) -> Dict[str, npt.NDArray[np.float32]]:
+        frame_samples = x[:, ::FFT_HOP, 0][:, :ANNOT_N_FRAMES]
+        return {
+            k: frame_samples[:, :, np.newaxis] + np.arange(n_freqs, dtype=np.float32)
+            for k, n_freqs in OUTPUT_SIZES.items()
+        }
+
+
+def reference_output(audio: npt.NDArray[np.float32]) -> Dict[str, npt.NDArray[np.float32]]:
+    audio_windowed, _, audio_original_length = get_audio_input(audio, OVERLAP_LEN, HOP_SIZE)
+    output = WindowModel().predict(np.asarray(audio_windowed))
+    return {k: unwrap_output(v, audio_original_length, N_OVERLAPPING_FRAMES) for k, v in output.items()}
+
+
+def assert_outputs_equal(actual: Dict[str, np.ndarray], expected: Dict[str, np.ndarray]) -> None:
+    assert actual.keys() == expected.keys()
+    for k in expected:
+        assert actual[k].shape == expected[k].shape, k
+        np.testing.assert_array_equal(actual[k], expected[k])
+
+
+# lengths around whole batches of windows, where a batch can start past the expected number of frames
+@pytest.mark.parametrize("batch_size", [1, 3, 16])
+@pytest.mark.parametrize("n_batches", [1, 2])
+@pytest.mark.parametrize("offset", [-OVERLAP_LEN // 2 - 1, -1, 0, 1, OVERLAP_LEN // 2 + 1])
+def test_run_inference_batch_boundaries(tmp_path: pathlib.Path, batch_size: int, n_batches: int, offset: int) -> None:
+    n_samples = n_batches * batch_size * HOP_SIZE + offset
+    audio = np.random.default_rng(n_samples).uniform(-1, 1, n_samples).astype(np.float32)
+    expected = reference_output(audio)
+
+    assert_outputs_equal(run_inference(audio, WindowModel(), batch_size=batch_size), expected)
+
+    audio_path = tmp_path / "audio.wav"
+    soundfile.write(audio_path, audio, AUDIO_SAMPLE_RATE, subtype="FLOAT")
+    assert_outputs_equal(run_inference(audio_path, WindowModel(), batch_size=batch_size), expected)
+
+
+@pytest.mark.parametrize("n_samples, batch_size", [(1158000, 16), (104653, 1)])
+def test_run_inference_reported_lengths(n_samples: int, batch_size: int) -> None:
+    audio = np.random.default_rng(0).uniform(-1, 1, n_samples).astype(np.float32)
+    assert_outputs_equal(run_inference(audio, WindowModel(), batch_size=batch_size), reference_output(audio))
+
+
+@pytest.mark.parametrize("estimated_length", [None, 0, 1, HOP_SIZE, 3 * HOP_SIZE])
+def test_output_stitcher_grows_past_estimated_length(estimated_length: int) -> None:
+    audio = np.random.default_rng(1).uniform(-1, 1, 5 * HOP_SIZE).astype(np.float32)
+    audio_windowed, _, audio_original_length = get_audio_input(audio, OVERLAP_LEN, HOP_SIZE)
+
+    stitcher = OutputStitcher(N_OVERLAPPING_FRAMES, estimated_length)
+    for i in range(0, audio_windowed.shape[0], 2):
+        stitcher.append(WindowModel().predict(np.asarray(audio_windowed[i : i + 2])))
+
+    output = stitcher.result(audio_original_length)
+    assert_outputs_equal(output, reference_output(audio))
+    # outputs of grown buffers are copied out, so they do not keep the larger buffers alive
+    for v in output.values():
+        assert v.base is None or v.base.shape[0] <= audio_windowed.shape[0] * (ANNOT_N_FRAMES - N_OVERLAPPING_FRAMES)
+
+
+@pytest.mark.parametrize("n_samples, batch_size", [(1158000, 16), (104653, 1), (HOP_SIZE, 3), (0, 1)])
+def test_output_stitcher_exact_length_allocates_once(n_samples: int, batch_size: int) -> None:
+    audio = np.random.default_rng(3).uniform(-1, 1, n_samples).astype(np.float32)
+    audio_windowed, _, audio_original_length = get_audio_input(audio, OVERLAP_LEN, HOP_SIZE)
+    n_window_frames = ANNOT_N_FRAMES - N_OVERLAPPING_FRAMES
+
+    stitcher = OutputStitcher(N_OVERLAPPING_FRAMES, audio_original_length)
+    buffers = None
+    for i in range(0, audio_windowed.shape[0], batch_size):
+        stitcher.append(WindowModel().predict(np.asarray(audio_windowed[i : i + batch_size])))
+        buffers = buffers or dict(stitcher.buffers)
+        assert all(stitcher.buffers[k] is v for k, v in buffers.items())
+
+    output = stitcher.result(audio_original_length)
+    assert_outputs_equal(output, reference_output(audio))
+    for k, v in output.items():
+        assert v.base is buffers[k]
+        assert v.base.shape[0] == audio_windowed.shape[0] * n_window_frames
+
+
+def test_window_empty_audio() -> None:
+    audio = np.zeros((0,), dtype=np.float32)
+    for audio_windowed, window_times in [window_audio_file(audio, HOP_SIZE), window_padded_audio(audio, 0, HOP_SIZE)]:
+        assert audio_windowed.shape == (0, AUDIO_N_SAMPLES, 1)
+        assert audio_windowed.dtype == np.float32
+        assert window_times == []
+
+
+def test_model_rejects_unknown_graph_optimization_level() -> None:
+    with pytest.raises(ValueError, match="graph_optimization_level"):
+        Model(ICASSP_2022_MODEL_PATH, graph_optimization_level="fastest")
+
+
+def random_model_output(n_frames: int = 500) -> Dict[str, npt.NDArray[np.float32]]:
+    rng = np.random.default_rng(2)
+    return {k: rng.random((n_frames, n_freqs), dtype=np.float32) for k, n_freqs in OUTPUT_SIZES.items()}
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_float32_model_output_round_trip(tmp_path: pathlib.Path, mmap: bool) -> None:
+    model_output = random_model_output()
+    save_path = tmp_path / "output.npz"
+    save_model_output(model_output, save_path, "float32")
+
+    loaded = load_model_output(save_path, mmap=mmap)
+    assert_outputs_equal(loaded, model_output)
+    for v in loaded.values():
+        assert isinstance(v, np.memmap) == mmap
+        assert v.dtype == np.float32
+
+
+@pytest.mark.parametrize("precision, atol", [("float16", 1e-3), ("uint8", 0.5 / 255)])
+@pytest.mark.parametrize("mmap", [False, True])
+def test_compressed_model_output_round_trip(tmp_path: pathlib.Path, precision: str, atol: float, mmap: bool) -> None:
+    model_output = random_model_output()
+    save_path = tmp_path / "output.npz"
+    save_model_output(model_output, save_path, precision)
+
+    loaded = load_model_output(save_path, mmap=mmap)
+    assert loaded.keys() == model_output.keys()
+    for k, v in loaded.items():
+        assert v.dtype == np.float32 and not isinstance(v, np.memmap)
+        np.testing.assert_allclose(v, model_output[k], atol=atol)
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_legacy_pickled_model_output(tmp_path: pathlib.Path, mmap: bool) -> None:
+    model_output = random_model_output()
+    save_path = tmp_path / "output.npz"
+    np.savez(save_path, **{MODEL_OUTPUT_NPZ_KEY: model_output})
+
+    assert_outputs_equal(load_model_output(save_path, mmap=mmap), model_output)
+
+
+def test_decode_model_output_keeps_dotted_names(tmp_path: pathlib.Path) -> None:
+    model_output_paths = [tmp_path / f"{name}_basic_pitch.npz" for name in ["take.v1", "take.v2", "take"]]
+    for model_output_path in model_output_paths:
+        save_model_output(random_model_output(), model_output_path, "float32")
+    output_directory = tmp_path / "decoded"
+    output_directory.mkdir()
+
+    decode_and_save(model_output_paths, output_directory, save_midi=True, sonify_midi=False, save_notes=True)
+
+    assert sorted(p.name for p in output_directory.iterdir()) == sorted(
+        f"{name}_basic_pitch.{ext}" for name in ["take", "take.v1", "take.v2"] for ext in ["csv", "mid"]
+    )
@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright 2022 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import List, Optional, Tuple
+
+import librosa
+import numpy as np
+import pytest
+import scipy
+
+from basic_pitch.note_creation import MAX_FREQ_IDX, MIDI_OFFSET, output_to_notes_polyphonic
+
+N_FREQS = 88
+
+
+# The pure-Python note tracking that the numba kernels replaced, kept as a reference.
+def reference_constrain_frequency(
+    onsets: np.array, frames: np.array, max_freq: Optional[float], min_freq: Optional[float]
+) -> Tuple[np.array, np.array]:
+    if max_freq is not None:
+        max_freq_idx = int(np.round(librosa.hz_to_midi(max_freq) - MIDI_OFFSET))
+        onsets[:, max_freq_idx:] = 0
+        frames[:, max_freq_idx:] = 0
+    if min_freq is not None:
+        min_freq_idx = int(np.round(librosa.hz_to_midi(min_freq) - MIDI_OFFSET))
+        onsets[:, :min_freq_idx] = 0
+        frames[:, :min_freq_idx] = 0
+
+    return onsets, frames
+
+
+def reference_get_infered_onsets(onsets: np.array, frames: np.array, n_diff: int = 2) -> np.array:
+    diffs = []
+    for n in range(1, n_diff + 1):
+        frames_appended = np.concatenate([np.zeros((n, frames.shape[1])), frames])
+        diffs.append(frames_appended[n:, :] - frames_appended[:-n, :])
+    frame_diff = np.min(diffs, axis=0)
+    frame_diff[frame_diff < 0] = 0
+    frame_diff[:n_diff, :] = 0
+    frame_diff = np.max(onsets) * frame_diff / np.max(frame_diff)  # rescale to have the same max as onsets
+
+    max_onsets_diff = np.max([onsets, frame_diff], axis=0)  # use the max of the predicted onsets and the differences
+
+    return max_onsets_diff
+
+
+def reference_output_to_notes_polyphonic(
+    frames: np.array,
+    onsets: np.array,
+    onset_thresh: float,
+    frame_thresh: float,
+    min_note_len: int,
+    infer_onsets: bool,
+    max_freq: Optional[float],
+    min_freq: Optional[float],
+    melodia_trick: bool = True,
+    energy_tol: int = 11,
+) -> List[Tuple[int, int, int, float]]:
+    n_frames = frames.shape[0]
+
+    onsets, frames = reference_constrain_frequency(onsets, frames, max_freq, min_freq)
+    # use onsets inferred from frames in addition to the predicted onsets
+    if infer_onsets:
+        onsets = reference_get_infered_onsets(onsets, frames)
+
+    peak_thresh_mat = np.zeros(onsets.shape)
+    peaks = scipy.signal.argrelmax(onsets, axis=0)
+    peak_thresh_mat[peaks] = onsets[peaks]
+
+    onset_idx = np.where(peak_thresh_mat >= onset_thresh)
+    onset_time_idx = onset_idx[0][::-1]  # sort to go backwards in time
+    onset_freq_idx = onset_idx[1][::-1]  # sort to go backwards in time
+
+    remaining_energy = np.zeros(frames.shape)
+    remaining_energy[:, :] = frames[:, :]
+
+    # loop over onsets
+    note_events = []
+    for note_start_idx, freq_idx in zip(onset_time_idx, onset_freq_idx):
+        # if we're too close to the end of the audio, continue
+        if note_start_idx >= n_frames - 1:
+            continue
+
+        # find time index at this frequency band where the frames drop below an energy threshold
+        i = note_start_idx + 1
+        k = 0  # number of frames since energy dropped below threshold
+        while i < n_frames - 1 and k < energy_tol:
+            if remaining_energy[i, freq_idx] < frame_thresh:
+                k += 1
+            else:
+                k = 0
+            i += 1
+
+        i -= k  # go back to frame above threshold
+
+        # if the note is too short, skip it
+        if i - note_start_idx <= min_note_len:
+            continue
+
+        remaining_energy[note_start_idx:i, freq_idx] = 0
+        if freq_idx < MAX_FREQ_IDX:
+            remaining_energy[note_start_idx:i, freq_idx + 1] = 0
+        if freq_idx > 0:
+            remaining_energy[note_start_idx:i, freq_idx - 1] = 0
+
+        # add the note
+        amplitude = np.mean(frames[note_start_idx:i, freq_idx])
+        note_events.append((note_start_idx, i, freq_idx + MIDI_OFFSET, amplitude))
+
+    if melodia_trick:
+        energy_shape = remaining_energy.shape
+
+        while np.max(remaining_energy) > frame_thresh:
+            i_mid, freq_idx = np.unravel_index(np.argmax(remaining_energy), energy_shape)
+            remaining_energy[i_mid, freq_idx] = 0
+
+            # forward pass
+            i = i_mid + 1
+            k = 0
+            while i < n_frames - 1 and k < energy_tol:
+                if remaining_energy[i, freq_idx] < frame_thresh:
+                    k += 1
+                else:
+                    k = 0
+
+                remaining_energy[i, freq_idx] = 0
+                if freq_idx < MAX_FREQ_IDX:
+                    remaining_energy[i, freq_idx + 1] = 0
+                if freq_idx > 0:
+                    remaining_energy[i, freq_idx - 1] = 0
+
+                i += 1
+
+            i_end = i - 1 - k  # go back to frame above threshold
+
+            # backward pass
+            i = i_mid - 1
+            k = 0
+            while i > 0 and k < energy_tol:
+                if remaining_energy[i, freq_idx] < frame_thresh:
+                    k += 1
+                else:
+                    k = 0
+
+                remaining_energy[i, freq_idx] = 0
+                if freq_idx < MAX_FREQ_IDX:
+                    remaining_energy[i, freq_idx + 1] = 0
+                if freq_idx > 0:
+                    remaining_energy[i, freq_idx - 1] = 0
+
+                i -= 1
+
+            i_start = i + 1 + k  # go back to frame above threshold
+            assert i_start >= 0, "{}".format(i_start)
+            assert i_end < n_frames
+
+            if i_end - i_start <= min_note_len:
+                # note is too short, skip it
+                continue
+
+            # add the note
+            amplitude = np.mean(frames[i_start:i_end, freq_idx])
+            note_events.append((i_start, i_end, freq_idx + MIDI_OFFSET, amplitude))
+
+    return note_events
+
+
+def random_activations(seed: int, n_frames: int, n_levels: Optional[int] = None) -> Tuple[np.array, np.array]:
+    """Frame and onset activations with sustained blobs, so that notes span several frames.
+    With n_levels, activations are quantized so that many frames have the same energy."""
+    rng = np.random.default_rng(seed)
+    frames = rng.random((n_frames, N_FREQS)) ** 3
+    frames = scipy.ndimage.uniform_filter1d(frames, size=5, axis=0) * 1.5
+    onsets = rng.random((n_frames, N_FREQS)) ** 4
+    # activations at the very first and last frames and the lowest and highest pitches
+    frames[[0, -1], :] = rng.random((2, N_FREQS))
+    frames[:, [0, -1]] = rng.random((n_frames, 2))
+    onsets[[0, 1, -2, -1], :] = rng.random((4, N_FREQS))
+    if n_levels is not None:
+        frames = np.round(frames * n_levels) / n_levels
+        onsets = np.round(onsets * n_levels) / n_levels
+    return np.clip(frames, 0, 1).astype(np.float32), np.clip(onsets, 0, 1).astype(np.float32)
+
+
+def assert_notes_match(frames: np.array, onsets: np.array, **kwargs) -> None:
+    expected = reference_output_to_notes_polyphonic(frames.copy(), onsets.copy(), **kwargs)
+    actual = list(output_to_notes_polyphonic(frames, onsets, **kwargs))
+
+    assert [note[:3] for note in actual] == [note[:3] for note in expected]
+    np.testing.assert_allclose([note[3] for note in actual], [note[3] for note in expected], rtol=1e-6)
+
+
+@pytest.mark.parametrize("seed", range(8))
+@pytest.mark.parametrize("infer_onsets", [True, False])
+@pytest.mark.parametrize("melodia_trick", [True, False])
+def test_output_to_notes_polyphonic_matches_reference(seed: int, infer_onsets: bool, melodia_trick: bool) -> None:
+    frames, onsets = random_activations(seed, n_frames=200 + 37 * seed)
+    assert_notes_match(
+        frames,
+        onsets,
+        onset_thresh=0.5,
+        frame_thresh=0.3,
+        min_note_len=11,
+        infer_onsets=infer_onsets,
+        max_freq=None,
+        min_freq=None,
+        melodia_trick=melodia_trick,
+    )
+
+
+@pytest.mark.parametrize("min_note_len", [0, 1, 11, 50, 1000])
+@pytest.mark.parametrize("energy_tol", [1, 2, 11, 1000])
+def test_output_to_notes_polyphonic_limits(min_note_len: int, energy_tol: int) -> None:
+    frames, onsets = random_activations(min_note_len + energy_tol, n_frames=150)
+    assert_notes_match(
+        frames,
+        onsets,
+        onset_thresh=0.3,
+        frame_thresh=0.2,
+        min_note_len=min_note_len,
+        infer_onsets=True,
+        max_freq=None,
+        min_freq=None,
+        energy_tol=energy_tol,
+    )
+
+
+@pytest.mark.parametrize("n_frames", [2, 3, 12, 13])
+@pytest.mark.parametrize("frame_thresh", [0.0, 0.3, 1.0])
+def test_output_to_notes_polyphonic_short_inputs(n_frames: int, frame_thresh: float) -> None:
+    frames, onsets = random_activations(n_frames, n_frames=n_frames)
+    assert_notes_match(
+        frames,
+        onsets,
+        onset_thresh=0.5,
+        frame_thresh=frame_thresh,
+        min_note_len=0,
+        infer_onsets=False,
+        max_freq=None,
+        min_freq=None,
+    )
+
+
+@pytest.mark.parametrize("seed", range(6))
+@pytest.mark.parametrize("n_levels", [2, 4, 8])
+def test_melodia_tie_order_matches_reference(seed: int, n_levels: int) -> None:
+    # with few energy levels, many frames are tied for the maximum remaining energy; the
+    # reference takes the first of them in row-major order on each step of the melodia loop
+    frames, onsets = random_activations(seed, n_frames=160, n_levels=n_levels)
+    assert_notes_match(
+        frames,
+        onsets,
+        onset_thresh=0.9,
+        frame_thresh=0.3,
+        min_note_len=2,
+        infer_onsets=False,
+        max_freq=None,
+        min_freq=None,
+        melodia_trick=True,
+    )
+
+
+@pytest.mark.parametrize("max_freq, min_freq", [(1000.0, None), (None, 100.0), (1000.0, 100.0)])
+def test_output_to_notes_polyphonic_frequency_limits(max_freq: Optional[float], min_freq: Optional[float]) -> None:
+    frames, onsets = random_activations(3, n_frames=200)
+    assert_notes_match(
+        frames,
+        onsets,
+        onset_thresh=0.5,
+        frame_thresh=0.3,
+        min_note_len=5,
+        infer_onsets=True,
+        max_freq=max_freq,
+        min_freq=min_freq,
+    )
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright 2022 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Dict, List
+
+import numpy as np
+import numpy.typing as npt
+import pytest
+
+from basic_pitch.constants import ANNOT_N_FRAMES, ANNOTATIONS_FPS, AUDIO_SAMPLE_RATE, FFT_HOP
+from basic_pitch.inference import Model, run_inference
+from basic_pitch.note_creation import MIDI_OFFSET, model_output_to_notes
+from basic_pitch.streaming import StreamingTranscriber
+
+N_FREQS = 88
+# offline and streaming frame times come from different clocks; allow one frame of difference
+TIME_TOLERANCE_S = 1 / ANNOTATIONS_FPS
+
+
+class PianoRollModel(Model):
+    """Stand-in for the network that reads a piano roll encoded in the audio: a sample value of
+    (freq_idx + 1) / 128 means that pitch is sounding, and zero means silence."""
+
+    def __init__(self) -> None:
+        self.model_path = "piano-roll-model"
+
+    def predict(self, x: npt.NDArray[np.float32]) -> Dict[str, npt.NDArray[np.float32]]:
+        freq_idx = np.round(x[:, ::FFT_HOP, 0][:, :ANNOT_N_FRAMES] * 128).astype(int) - 1
+        note = np.zeros(freq_idx.shape + (N_FREQS,), dtype=np.float32)
+        window_idx, frame_idx = np.nonzero((freq_idx >= 0) & (freq_idx < N_FREQS))
+        note[window_idx, frame_idx, freq_idx[window_idx, frame_idx]] = 0.9
+
+        onset = np.zeros_like(note)
+        onset[:, 1:] = np.clip(note[:, 1:] - note[:, :-1], 0, 1)
+        return {"note": note, "onset": onset, "contour": np.repeat(note, 3, axis=2)}
+
+
+def piano_roll_audio(seed: int, n_notes: int = 20) -> npt.NDArray[np.float32]:
+    """Audio for PianoRollModel: notes of random pitch and length separated by short silences."""
+    rng = np.random.default_rng(seed)
+    segments = []
+    for _ in range(n_notes):
+        duration = int(rng.uniform(0.3, 1.5) * AUDIO_SAMPLE_RATE)
+        segments.append(np.full(duration, (rng.integers(10, 70) + 1) / 128, dtype=np.float32))
+        segments.append(np.zeros(int(rng.uniform(0.1, 0.5) * AUDIO_SAMPLE_RATE), dtype=np.float32))
+    return np.concatenate(segments)
+
+
+def stream(audio: npt.NDArray[np.float32], chunk_size: int) -> List[list]:
+    """Push audio in chunks of chunk_size samples and return the note events of each call."""
+    transcriber = StreamingTranscriber(PianoRollModel(), include_pitch_bends=False)
+    batches = [transcriber.push(audio[i : i + chunk_size]) for i in range(0, audio.shape[0], chunk_size)]
+    batches.append(transcriber.flush())
+    assert [note for batch in batches for note in batch] == transcriber.note_events
+    return batches
+
+
+@pytest.mark.parametrize("chunk_size", [512, 4096, 44100])
+def test_streaming_emits_each_note_once(chunk_size: int) -> None:
+    batches = stream(piano_roll_audio(0), chunk_size)
+    note_events = [note for batch in batches for note in batch]
+
+    keys = [(start, pitch) for start, _, pitch, _, _ in note_events]
+    assert len(note_events) > 0
+    assert len(set(keys)) == len(keys)
+    # notes are committed in order, so a later push never emits a note before an earlier one
+    assert keys == sorted(keys)
+
+
+def test_streaming_chunk_size_does_not_change_notes() -> None:
+    audio = piano_roll_audio(1)
+    expected = [note for batch in stream(audio, AUDIO_SAMPLE_RATE) for note in batch]
+
+    for chunk_size in [333, 2048, 10000, audio.shape[0]]:
+        assert [note for batch in stream(audio, chunk_size) for note in batch] == expected
+
+
+def test_streaming_flush_empty_stream() -> None:
+    transcriber = StreamingTranscriber(PianoRollModel())
+
+    assert transcriber.flush() == []
+    assert transcriber.note_events == []
+    assert transcriber.flush() == []
+    assert sum(len(instrument.notes) for instrument in transcriber.to_midi().instruments) == 0
+    with pytest.raises(AssertionError):
+        transcriber.push(np.zeros(100, dtype=np.float32))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_streaming_matches_offline_transcription(seed: int) -> None:
+    audio = piano_roll_audio(seed)
+    streamed = sorted(note for batch in stream(audio, 4096) for note in batch)
+
+    _, offline = model_output_to_notes(
+        run_inference(audio, PianoRollModel()), onset_thresh=0.5, frame_thresh=0.3, include_pitch_bends=False
+    )
+    offline = sorted(offline)
+
+    assert [note[2] for note in streamed] == [note[2] for note in offline]
+    np.testing.assert_allclose([note[:2] for note in streamed], [note[:2] for note in offline], atol=TIME_TOLERANCE_S)
+    np.testing.assert_allclose([note[3] for note in streamed], [note[3] for note in offline], rtol=1e-6)
+
+    # the decoded pitches are the ones encoded in the audio
+    encoded = np.unique(np.round(audio[audio > 0] * 128).astype(int) - 1 + MIDI_OFFSET)
+    assert set(note[2] for note in streamed) == set(encoded)
@@ -1,12 +1,13 @@
 from pathlib import Path
-import json, numpy as np, soundfile as sf
+import io, os, threading, contextlib
+import json, numpy as np
+import pretty_midi
 import basic_pitch
-from basic_pitch.inference import predict
+from basic_pitch.constants import AUDIO_SAMPLE_RATE
+from basic_pitch.inference import Model, load_audio, predict
 
-def _sanity_check_wav(wav_path, min_seconds=2.0, min_rms=0.005):
-    y, sr = sf.read(wav_path, dtype="float32", always_2d=False)
-    if y.ndim > 1:
-        y = np.mean(y, axis=1)
+def _sanity_check_audio(y, sr=AUDIO_SAMPLE_RATE, min_seconds=2.0, min_rms=0.005):
+    """y: mono signal (already decoded, so the file is not read again)."""
     dur = len(y) / float(sr) if sr else 0.0
     rms = float(np.sqrt(np.mean(y**2))) if len(y) else 0.0
     if dur < min_seconds:
@@ -23,9 +24,69 @@ def _find_onnx_model() -> str:
 
 _ONNX_MODEL = _find_onnx_model()  # resolved once
 
-def convert_audio_to_midi(wav_path: str, midi_out: str) -> str:
-    """Transcribe WAV -> MIDI using Basic Pitch ONNX backend."""
-    _sanity_check_wav(wav_path)
-    _, midi_data, _ = predict(wav_path, model_or_model_path=_ONNX_MODEL)
-    midi_data.write(midi_out)
-    return midi_out
+def load_basic_pitch_model() -> Model:
+    """Load the Basic Pitch ONNX model (builds a new ort.InferenceSession)."""
+    return Model(_ONNX_MODEL)
+
+# ----- Shared model pool -----
+# Creating the ONNX session costs about as much as transcribing a short clip, so sessions are
+# created on first use and reused by every transcription. Each caller checks out its own model,
+# so at most POOL_SIZE transcriptions run at once and they never share a session's threads.
+BASIC_PITCH_POOL_SIZE = int(os.environ.get("BASIC_PITCH_POOL_SIZE", "1"))
+
+class ModelPool:
+    """Lazily filled, thread-safe pool of up to `size` Basic Pitch models."""
+
+    def __init__(self, size: int = BASIC_PITCH_POOL_SIZE, factory=load_basic_pitch_model):
+        self.size = max(1, int(size))
+        self._factory = factory
+        self._idle = []  # stack: most recently used model first (warm caches)
+        self._cond = threading.Condition()
+        self._n_created = 0  # models created or being created
+
+    @contextlib.contextmanager
+    def model(self):
+        """Check out a model for one transcription; blocks while all `size` models are busy.
+        If creating a model fails, the error is raised here and a waiting caller tries again."""
+        with self._cond:
+            while not self._idle and self._n_created >= self.size:
+                self._cond.wait()
+            model = self._idle.pop() if self._idle else None
+            if model is None:
+                self._n_created += 1
+        if model is None:
+            try:
+                model = self._factory()
+            except Exception:
+                with self._cond:
+                    self._n_created -= 1
+                    self._cond.notify()  # free slot: the next waiter creates a model (or sees the error)
+                raise
+        try:
+            yield model
+        finally:
+            with self._cond:
+                self._idle.append(model)
+                self._cond.notify()
+
+_MODEL_POOL = ModelPool()
+
+def convert_audio_to_midi(audio, midi_out=None, model_or_model_path=None) -> pretty_midi.PrettyMIDI:
+    """Transcribe audio -> MIDI using Basic Pitch ONNX backend, without temp files.
+    audio: a path, raw file bytes, a binary file-like (e.g. an upload) or a mono array at AUDIO_SAMPLE_RATE.
+    midi_out: optional path or binary file-like to also write the MIDI to.
+    model_or_model_path: a Model or model path to use instead of the shared pool.
+    """
+    if isinstance(audio, (bytes, bytearray)):
+        audio = io.BytesIO(audio)
+    # decode + resample once; the sanity check and the model share the signal
+    y = audio if isinstance(audio, np.ndarray) else load_audio(audio)
+    _sanity_check_audio(y)
+    if model_or_model_path is None:
+        with _MODEL_POOL.model() as model:
+            _, midi_data, _ = predict(y, model_or_model_path=model)
+    else:
+        _, midi_data, _ = predict(y, model_or_model_path=model_or_model_path)
+    if midi_out is not None:
+        midi_data.write(midi_out)
+    return midi_data
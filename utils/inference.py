@@ -1,4 +1,5 @@
 from pathlib import Path
+import functools
 import json
 import numpy as np
 import tensorflow as tf
@@ -8,10 +9,17 @@ ROOT = Path(__file__).resolve().parents[1]
 MODEL_PATH  = ROOT / "model" / "best_cnn.keras"
 LABELS_PATH = Path(__file__).resolve().with_name("label_map.json")
 
-# ----- Load model + labels -----
-MODEL = tf.keras.models.load_model(str(MODEL_PATH), compile=False)
+# ----- Load labels (the model is loaded on first use) -----
 COMPOSERS = json.load(open(LABELS_PATH))   # e.g. ["Bach","Beethoven","Chopin","Mozart"]
 
+def load_composer_model():
+    """Load the Keras composer classifier. Slow, so keep the result around (e.g. st.cache_resource)."""
+    return tf.keras.models.load_model(str(MODEL_PATH), compile=False)
+
+@functools.lru_cache(maxsize=1)
+def _default_model():
+    return load_composer_model()
+
 SEQ_T  = 512
 N_KEYS = 88
 
@@ -37,12 +45,14 @@ def _prep_roll(pr: np.ndarray) -> np.ndarray:
     x = pr.reshape(1, SEQ_T, N_KEYS, 1)    # (1,512,88,1)
     return x
 
-def predict_composer(piano_roll: np.ndarray):
+def predict_composer(piano_roll: np.ndarray, model=None):
     """
     Returns (probabilities_dict, processed_roll_for_viz)
+    model: a loaded composer model; defaults to one loaded once per process.
     """
+    model = model if model is not None else _default_model()
     x = _prep_roll(piano_roll)                 # (1,512,88,1), values 0..127
-    probs = MODEL.predict(x, verbose=0)[0]     # (4,)
+    probs = model.predict(x, verbose=0)[0]     # (4,)
 
     # Map in index order *without* sorting labels; they already match training.
     order = np.argsort(probs)[::-1]